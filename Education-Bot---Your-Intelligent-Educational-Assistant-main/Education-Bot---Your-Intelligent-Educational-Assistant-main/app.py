@@ -1,18 +1,27 @@
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, Response, request, jsonify, render_template, session
 from google import genai
 from google.genai import types
 import os
 from dotenv import load_dotenv
+import json
 import logging
-import re
 import random
+import time
 import uuid
-import nltk
-from nltk.tokenize import word_tokenize, sent_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from nltk.tag import pos_tag
-import ssl
+from nltk_resources import warm_up
+from text_analysis import analyze_user_input, lemma_cache_stats, literal_tokens, warm_lemma_cache
+from caching import AnalysisCache, ResponseCache, normalize_text
+from chat_pipeline import ChatContext, Pipeline
+from query_filter import match_domain, match_query
+from model_routing import ModelRouter
+from history_window import HISTORY_TOKEN_BUDGET, estimate_tokens, select_history
+from summarizer import RollingSummarizer, summary_prompt
+from history_relevance import HistoryRelevanceIndex
+from prompt_cache import prompt_cache_from_env
+from session_store import session_store_from_env
+from message import Message, turn
+from semantic_cache import SemanticCache
+from single_flight import SingleFlight
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -21,31 +30,16 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize NLTK
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
-
-# Download required NLTK data
-try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-    nltk.download('wordnet', quiet=True)
-    nltk.download('averaged_perceptron_tagger', quiet=True)
-    nltk.download('punkt_tab', quiet=True)
-except:
-    logger.warning("Some NLTK data downloads failed, continuing with basic functionality")
-
-# Initialize NLTK components
-try:
-    lemmatizer = WordNetLemmatizer()
-    stop_words = set(stopwords.words('english'))
-except:
-    lemmatizer = None
-    stop_words = set()
+# Load NLTK data and the POS tagger once per process, before the first request
+warm_up()
+
+# Optionally pre-populate the lemma cache from a word-frequency list
+LEMMA_WARMUP_FILE = os.getenv('LEMMA_WARMUP_FILE')
+if LEMMA_WARMUP_FILE:
+    try:
+        warm_lemma_cache(LEMMA_WARMUP_FILE)
+    except OSError as e:
+        logger.warning(f"Could not warm lemma cache from {LEMMA_WARMUP_FILE}: {e}")
 
 app = Flask(__name__, static_folder='.', static_url_path='')
 app.secret_key = os.getenv('SECRET_KEY', os.urandom(24))  # For session management
@@ -60,72 +54,22 @@ else:
     logger.error("Google Gemini API key is not set! Make sure you have a .env file with GEMINI_API_KEY")
     client = None
 
-# Store conversation history in memory only (will be cleared on server restart)
-conversation_history = {}
-
-# Education-focused topics 
-EDUCATIONAL_DOMAINS = [
-    "mathematics", "algebra", "geometry", "calculus", "statistics", "probability",
-    "physics", "chemistry", "biology", "anatomy", "astronomy", "earth science",
-    "history", "geography", "civics", "economics", "political science",
-    "literature", "grammar", "writing", "poetry", "language arts",
-    "computer science", "programming", "data science", "artificial intelligence",
-    "art history", "music theory", "philosophy", "psychology", "sociology",
-    "foreign languages", "education", "study skills", "research methods"
-]
-
-def analyze_user_input(text):
-    """Analyze user input using NLTK for better understanding."""
-    try:
-        if not lemmatizer or not stop_words:
-            return {"tokens": [], "key_concepts": [], "question_type": "general", "complexity": "medium"}
-        
-        # Tokenize and clean
-        tokens = word_tokenize(text.lower())
-        
-        # Remove stop words and punctuation
-        meaningful_tokens = [token for token in tokens if token.isalnum() and token not in stop_words]
-        
-        # Lemmatize
-        lemmatized_tokens = [lemmatizer.lemmatize(token) for token in meaningful_tokens]
-        
-        # POS tagging to identify key concepts (nouns, adjectives)
-        pos_tags = pos_tag(meaningful_tokens)
-        key_concepts = [word for word, pos in pos_tags if pos.startswith('NN') or pos.startswith('JJ')]
-        
-        # Determine question type
-        question_type = "general"
-        if any(word in text.lower() for word in ["what", "define", "explain"]):
-            question_type = "definition"
-        elif any(word in text.lower() for word in ["how", "solve", "calculate"]):
-            question_type = "procedural"
-        elif any(word in text.lower() for word in ["why", "because", "reason"]):
-            question_type = "conceptual"
-        elif any(word in text.lower() for word in ["compare", "difference", "similar"]):
-            question_type = "comparison"
-        
-        # Estimate complexity based on vocabulary and sentence structure
-        sentences = sent_tokenize(text)
-        avg_sentence_length = sum(len(word_tokenize(sentence)) for sentence in sentences) / len(sentences)
-        
-        complexity = "medium"
-        if avg_sentence_length > 15 or len(key_concepts) > 5:
-            complexity = "high"
-        elif avg_sentence_length < 8 and len(key_concepts) < 3:
-            complexity = "low"
-        
-        return {
-            "tokens": lemmatized_tokens,
-            "key_concepts": key_concepts,
-            "question_type": question_type,
-            "complexity": complexity,
-            "sentence_count": len(sentences),
-            "word_count": len(meaningful_tokens)
-        }
-    
-    except Exception as e:
-        logger.warning(f"NLTK analysis failed: {e}")
-        return {"tokens": [], "key_concepts": [], "question_type": "general", "complexity": "medium"}
+# Cache of NLTK analysis results, keyed by a hash of the normalized input
+analysis_cache = AnalysisCache.from_env()
+
+# Cache of Gemini answers to repeated first-turn questions
+response_cache = ResponseCache.from_env()
+
+# Answers to paraphrased first-turn questions, matched on their lemma sets
+semantic_cache = SemanticCache.from_env()
+
+# Identical first-turn questions asked at the same moment share one Gemini call
+llm_flight = SingleFlight()
+
+# Conversation history, bounded by session count, idle time and (in memory)
+# total size; SESSION_STORE=sqlite shares it between workers and restarts
+session_store = session_store_from_env()
+session_store.start_reaper(int(os.getenv('SESSION_REAP_INTERVAL', '60')))
 
 def enhance_educational_prompt(user_input, analysis):
     """Enhance the educational prompt based on NLTK analysis."""
@@ -154,16 +98,8 @@ def enhance_educational_prompt(user_input, analysis):
     
     return base_prompt
 
-@app.route('/')
-def home():
-    # Create a unique session ID if not exists - but don't persist history
-    if 'session_id' not in session:
-        session['session_id'] = str(uuid.uuid4())
-        # Initialize an empty conversation history for this session
-        conversation_history[session['session_id']] = []
-    
-    # Return the modern dark-themed HTML directly from Python
-    html_content = '''
+# The modern dark-themed page, served directly from Python by home()
+HOME_HTML = '''
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -837,6 +773,7 @@ def home():
             
             messagesContainer.appendChild(messageDiv);
             messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            return messageDiv.querySelector('.message-content');
         }
 
         function showTypingIndicator() {
@@ -888,7 +825,7 @@ def home():
             showTypingIndicator();
 
             try {
-                const response = await fetch('/chat', {
+                const response = await fetch('/chat/stream', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
@@ -896,14 +833,16 @@ def home():
                     body: JSON.stringify({ message: message })
                 });
 
-                const data = await response.json();
-                hideTypingIndicator();
-                
-                if (data.error) {
-                    addMessage(`❌ Error: ${data.error}`, false);
-                } else {
-                    addMessage(data.reply, false);
+                // Errors come back as plain JSON rather than an event stream
+                const contentType = response.headers.get('Content-Type') || '';
+                if (!contentType.includes('text/event-stream')) {
+                    const data = await response.json();
+                    hideTypingIndicator();
+                    addMessage(data.error ? `❌ Error: ${data.error}` : data.reply, false);
+                    return;
                 }
+
+                await readReplyStream(response);
             } catch (error) {
                 hideTypingIndicator();
                 addMessage('❌ Sorry, there was an error connecting to the server. Please try again.', false);
@@ -914,6 +853,43 @@ def home():
             }
         }
 
+        async function readReplyStream(response) {
+            // Render Server-Sent Events from /chat/stream as the chunks arrive
+            const messagesContainer = document.getElementById('chat-messages');
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let reply = '';
+            let contentDiv = null;
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                const events = buffer.split('\\n\\n');
+                buffer = events.pop();
+                for (const event of events) {
+                    if (!event.startsWith('data: ')) continue;
+                    const data = JSON.parse(event.slice(6));
+
+                    if (data.type === 'chunk') {
+                        if (!contentDiv) {
+                            hideTypingIndicator();
+                            contentDiv = addMessage('', false);
+                        }
+                        reply += data.text;
+                        contentDiv.innerHTML = formatMessage(reply);
+                        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                    } else if (data.type === 'error') {
+                        hideTypingIndicator();
+                        addMessage(`❌ Error: ${data.error}`, false);
+                    }
+                }
+            }
+            hideTypingIndicator();
+        }
+
         function handleKeyPress(event) {
             if (event.key === 'Enter' && !event.shiftKey) {
                 event.preventDefault();
@@ -959,115 +935,51 @@ def home():
 </body>
 </html>
     '''
-    
-    return html_content
 
-def is_educational_query(query):
-    """Check if the query is related to education or chat functionality."""
-    query_lower = query.lower()
-    
-    # Accept chat history and self-reference queries
-    chat_patterns = [
-        r"(previous|last|earlier) (message|prompt|question)",
-        r"what (did|was) (i|you) (say|ask|told|tell)",
-        r"(show|display|get|fetch) (my|the) (history|conversation)",
-        r"what (is|was) my",
-        r"can you (remember|recall)",
-        r"who (am i|are you)"
-    ]
-    
-    for pattern in chat_patterns:
-        if re.search(pattern, query_lower):
-            return True
-    
-    # Check for educational keywords
-    for domain in EDUCATIONAL_DOMAINS:
-        if domain in query_lower:
-            return True
-            
-    # Check for educational question patterns
-    educational_patterns = [
-        r"what (is|are|was|were) .+\?",
-        r"how (do|does|can|could) .+\?",
-        r"why (is|are|does|do) .+\?",
-        r"explain .+",
-        r"define .+",
-        r"describe .+",
-        r"teach me .+",
-        r"learn about .+",
-        r"understand .+",
-        r"(help|assist) .+ (with|in) .+"
-    ]
+@app.route('/')
+def home():
+    # Create a unique session ID if not exists; its history is created by the first message
+    if 'session_id' not in session:
+        session['session_id'] = str(uuid.uuid4())
     
-    for pattern in educational_patterns:
-        if re.search(pattern, query_lower):
-            return True
-            
-    return False
-
-@app.route('/chat', methods=['POST'])
-def chat():
-    if not GEMINI_API_KEY or not client:
-        logger.error("Google Gemini API key is missing or client initialization failed")
-        return jsonify({"error": "Google Gemini API key not set. Please check your .env file."}), 500
-
-    try:
-        # Get user input from the request
-        data = request.get_json()
-        if not data:
-            logger.error("No JSON data received")
-            return jsonify({"error": "No JSON data received"}), 400
-
-        user_input = data.get('message')
-        logger.debug(f"Received user input: {user_input}")
-        
-        if not user_input:
-            logger.error("No message provided in request")
-            return jsonify({"error": "No message provided"}), 400
-            
-        # Get or create session ID
-        session_id = session.get('session_id')
-        if not session_id or session_id not in conversation_history:
-            session_id = str(uuid.uuid4())
-            session['session_id'] = session_id
-            conversation_history[session_id] = []
-        
-        # Add user message to history
-        conversation_history[session_id].append({
-            "role": "user",
-            "content": user_input
-        })
-
-        # Analyze user input with NLTK
-        input_analysis = analyze_user_input(user_input)
-        logger.debug(f"NLTK Analysis: {input_analysis}")
-
-        # Check if the query is educational
-        if not is_educational_query(user_input):
-            bot_response = "I'm an educational assistant and can help you with academic topics like math, science, history, and literature. Could you please ask me something related to education or learning?"
-            
-            # Add bot response to history
-            conversation_history[session_id].append({
-                "role": "assistant",
-                "content": bot_response
-            })
-            
-            # Limit history size (keep last 20 messages)
-            if len(conversation_history[session_id]) > 20:
-                conversation_history[session_id] = conversation_history[session_id][-20:]
-                
-            return jsonify({
-                "reply": bot_response,
-                "history": conversation_history[session_id],
-                "analysis": input_analysis
-            })
-        
-        # Craft an enhanced system prompt using NLTK analysis
-        enhanced_prompt = enhance_educational_prompt(user_input, input_analysis)
-        
-        system_prompt = f"""You are EduBot, an educational assistant focused on helping students learn while also being able to engage in natural conversation.
-
-{enhanced_prompt}
+    return HOME_HTML
+
+OFF_TOPIC_REPLY = "I'm an educational assistant and can help you with academic topics like math, science, history, and literature. Could you please ask me something related to education or learning?"
+
+GEMINI_MODEL = "gemini-2.0-flash"
+GENERATION_SETTINGS = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 1024,
+}
+
+# Picks the model and generation settings for each question; GEMINI_MODEL and
+# GENERATION_SETTINGS are the defaults the routes build on
+model_router = ModelRouter.from_env(GENERATION_SETTINGS)
+
+SUMMARY_MODEL = os.getenv('SUMMARY_MODEL', 'gemini-2.0-flash-lite')
+SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS', '300'))
+
+def summarize_turns(previous, messages):
+    """Fold evicted messages into a session's running summary with Gemini."""
+    if not client:
+        raise RuntimeError("Gemini client is not configured")
+    response = client.models.generate_content(
+        model=SUMMARY_MODEL,
+        contents=summary_prompt(previous, messages, SUMMARY_MAX_TOKENS),
+        config=types.GenerateContentConfig(temperature=0.2, max_output_tokens=SUMMARY_MAX_TOKENS),
+    )
+    return response.text.strip()
+
+# Turns trimmed from a session's history live on in a summary built in the background
+summarizer = RollingSummarizer(summarize_turns, max_tokens=SUMMARY_MAX_TOKENS,
+                               max_workers=int(os.getenv('SUMMARY_WORKERS', '1')))
+
+# Instructions shared by every request; per-question guidance from
+# enhance_educational_prompt is appended to the question itself, so this
+# prefix never changes and can be cached
+SYSTEM_INSTRUCTION = """You are EduBot, an educational assistant focused on helping students learn while also being able to engage in natural conversation.
 
 Your primary focus is educational content, but you should also:
 1. Be able to respond to questions about the conversation history
@@ -1082,92 +994,333 @@ When explaining educational concepts:
 - Mention real-world applications when relevant
 - Adjust your explanation level based on the question complexity
 
+The latest user message ends with notes on the question type and complexity; follow them, but don't mention them.
+
 If someone asks to see their previous message or what they asked before, show them their previous prompt.
 Maintain a conversational, friendly tone while being informative and helpful.
 
 If you're not sure about a fact, acknowledge the uncertainty rather than providing potentially incorrect information."""
 
-        # Prepare the content structure with conversation history
-        contents = []
-        
-        # Add system prompt as the first message
+# Optional context caching of SYSTEM_INSTRUCTION (PROMPT_CACHE_BACKEND)
+prompt_cache = prompt_cache_from_env(client)
+
+# How earlier turns are picked for the prompt: "relevance" sends the latest turn
+# plus the turns that share lemmas with the question, "recent" the newest turns
+HISTORY_SELECTION = os.getenv('HISTORY_SELECTION', 'relevance')
+history_index = HistoryRelevanceIndex()
+
+def forget_session(session_id, reason=None):
+    """Drop the per-session state kept alongside a session's history."""
+    summarizer.forget(session_id)
+    history_index.forget(session_id)
+
+session_store.add_eviction_listener(forget_session)
+
+def append_to_history(session_id, *messages):
+    """Append messages to a session's history, keeping the last 20.
+
+    Older messages are handed to the summarizer rather than just dropped.
+    """
+    trimmed = session_store.append(session_id, *messages)
+    if trimmed:
+        summarizer.submit(session_id, trimmed)
+
+def reply_payload(ctx):
+    return {
+        "reply": ctx.reply,
+        "history": [message.to_dict() for message in session_store.get(ctx.session_id) or []],
+        "analysis": ctx.analysis
+    }
+
+# /chat is handled by the stages below, cheapest first. Any stage can end the
+# request early, e.g. off-topic messages never reach NLTK or Gemini.
+
+def validate_stage(ctx):
+    if not GEMINI_API_KEY or not client:
+        logger.error("Google Gemini API key is missing or client initialization failed")
+        return {"error": "Google Gemini API key not set. Please check your .env file."}, 500
+
+    if not ctx.data:
+        logger.error("No JSON data received")
+        return {"error": "No JSON data received"}, 400
+
+    ctx.user_input = ctx.data.get('message')
+    logger.debug(f"Received user input: {ctx.user_input}")
+
+    if not ctx.user_input:
+        logger.error("No message provided in request")
+        return {"error": "No message provided"}, 400
+
+    # Get or create session ID
+    session_id = ctx.session.get('session_id')
+    if not session_id:
+        session_id = str(uuid.uuid4())
+        ctx.session['session_id'] = session_id
+    history = session_store.get(session_id)
+    if history is None:
+        session_store.create(session_id)
+        history = session_store.get(session_id)
+    ctx.session_id = session_id
+    ctx.history = history
+    ctx.model = GEMINI_MODEL
+    ctx.generation_settings = dict(GENERATION_SETTINGS)
+    return None
+
+def gate_stage(ctx):
+    # Check if the query is educational
+    ctx.matched_rule = match_query(ctx.user_input)
+    logger.debug(f"Query filter rule: {ctx.matched_rule}")
+    if not ctx.matched_rule:
+        ctx.reply = OFF_TOPIC_REPLY
+        append_to_history(ctx.session_id, *turn(ctx.user_input, ctx.reply))
+        return reply_payload(ctx), 200
+    return None
+
+def cache_lookup_stage(ctx):
+    ctx.analysis = analysis_cache.get(ctx.user_input)
+    return None
+
+def analysis_stage(ctx):
+    # Analyze user input with NLTK
+    if ctx.analysis is None:
+        ctx.analysis = analyze_user_input(normalize_text(ctx.user_input))
+        analysis_cache.put(ctx.user_input, ctx.analysis)
+    logger.debug(f"NLTK Analysis: {ctx.analysis}")
+    return None
+
+def route_stage(ctx):
+    domain = match_domain(ctx.user_input)
+    ctx.route = model_router.route(ctx.analysis["complexity"], ctx.analysis["question_type"],
+                                   domain.split('/')[0] if domain else None)
+    ctx.model = ctx.route.model
+    ctx.generation_settings = dict(ctx.route.generation_settings)
+    logger.debug(f"Routed to '{ctx.route.name}' ({ctx.model})")
+    return None
+
+def semantic_partition(ctx):
+    """Answers are only shared between questions of the same type and model config."""
+    return (ctx.analysis["question_type"], ctx.model, tuple(sorted(ctx.generation_settings.items())))
+
+def response_cache_stage(ctx):
+    key = response_cache.key(ctx.user_input, ctx.model, ctx.generation_settings)
+    if not ctx.history:
+        ctx.flight_key = key
+
+    # Follow-up questions depend on the history, so by default only first turns are cached
+    if not response_cache.applies_to(ctx.history):
+        return None
+    ctx.response_cache_key = key
+    # Symbols and negations aren't in the lemmas, so such questions only match exactly
+    ctx.paraphrase_safe = literal_tokens(ctx.user_input) == []
+    cached_reply = response_cache.get(ctx.response_cache_key)
+    if cached_reply is None and ctx.paraphrase_safe:
+        # Fall back to the answer to a paraphrase of an earlier question of the same type
+        paraphrase_key = semantic_cache.get(ctx.analysis["tokens"], semantic_partition(ctx))
+        if paraphrase_key:
+            cached_reply = response_cache.get(paraphrase_key)
+    if cached_reply is None:
+        return None
+    logger.debug("Answering from the response cache")
+    ctx.reply = cached_reply
+    ctx.reply_cached = True
+    return persist_stage(ctx)
+
+def prompt_build_stage(ctx):
+    # The static instructions are attached as system_instruction; the guidance
+    # built from the NLTK analysis goes into the last user message instead
+    contents = []
+    
+    # Turns that no longer fit in the history are represented by their summary
+    budget = HISTORY_TOKEN_BUDGET
+    summary = summarizer.get(ctx.session_id)
+    if summary:
+        summary_text = f"Summary of our earlier conversation (those messages are not shown):\n{summary}"
         contents.append(
             types.Content(
                 role="user",
-                parts=[types.Part.from_text(text=system_prompt)]
+                parts=[types.Part.from_text(text=summary_text)]
             )
         )
-        
-        # Add previous conversation history (limited to last few exchanges for context)
-        history_to_include = conversation_history[session_id][-10:] if len(conversation_history[session_id]) > 5 else conversation_history[session_id]
-        
-        for message in history_to_include:
-            role = "user" if message["role"] == "user" else "model"
-            contents.append(
-                types.Content(
-                    role=role,
-                    parts=[types.Part.from_text(text=message["content"])]
-                )
+        budget -= estimate_tokens(summary_text)
+
+    # Add previous conversation history, up to the token budget
+    current_message = Message.user(enhance_educational_prompt(ctx.user_input, ctx.analysis))
+    # Questions about the conversation itself ("what was my first question?")
+    # need the turns as they happened, not the ones that share its lemmas
+    if HISTORY_SELECTION == 'relevance' and not ctx.matched_rule.startswith('chat:'):
+        history_to_include = history_index.select(ctx.session_id, ctx.history, ctx.analysis, current_message, budget)
+    else:
+        history_to_include = select_history(ctx.history, current_message, budget)
+    
+    for message in history_to_include:
+        role = "user" if message.role == "user" else "model"
+        contents.append(
+            types.Content(
+                role=role,
+                parts=[types.Part.from_text(text=message.content)]
             )
-            
-        # Configure the content generation
-        generate_content_config = types.GenerateContentConfig(
-            temperature=0.7,
-            top_p=0.95,
-            top_k=40,
-            max_output_tokens=1024,
-            response_mime_type="text/plain",
         )
-
-        # Make the API call
-        logger.debug("Sending request to Gemini 2.0 Flash")
+    ctx.contents = contents
+        
+    # Configure the content generation
+    ctx.config = types.GenerateContentConfig(
+        **ctx.generation_settings,
+        **prompt_cache.config_fields(ctx.model, SYSTEM_INSTRUCTION),
+        response_mime_type="text/plain",
+    )
+    return None
+
+def llm_call_stage(ctx):
+    # Make the API call
+    def generate():
+        logger.debug(f"Sending request to {ctx.model}")
+        started = time.perf_counter()
         response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=contents,
-            config=generate_content_config,
+            model=ctx.model,
+            contents=ctx.contents,
+            config=ctx.config,
         )
-        
-        # Extract the bot's reply
-        bot_reply = response.text
-        
-        # Add bot response to history
-        conversation_history[session_id].append({
-            "role": "assistant",
-            "content": bot_reply
-        })
-        
-        # Limit history size (keep last 20 messages)
-        if len(conversation_history[session_id]) > 20:
-            conversation_history[session_id] = conversation_history[session_id][-20:]
-            
-        logger.debug(f"Received response from Google Gemini: {bot_reply[:100]}...")
-        return jsonify({
-            "reply": bot_reply, 
-            "history": conversation_history[session_id],
-            "analysis": input_analysis
-        })
+        model_router.record(ctx.route.name, (time.perf_counter() - started) * 1000, response.usage_metadata)
+        return response
+
+    if ctx.flight_key:
+        response = llm_flight.do(ctx.flight_key, generate)
+    else:
+        response = generate()
+    
+    # Extract the bot's reply
+    ctx.reply = response.text
+    logger.debug(f"Received response from Google Gemini: {ctx.reply[:100]}...")
+    return None
+
+def persist_stage(ctx):
+    if ctx.response_cache_key and not ctx.reply_cached:
+        response_cache.put(ctx.response_cache_key, ctx.reply)
+        if ctx.paraphrase_safe:
+            semantic_cache.put(ctx.analysis["tokens"], semantic_partition(ctx), ctx.response_cache_key)
+    append_to_history(ctx.session_id, *turn(ctx.user_input, ctx.reply))
+    return reply_payload(ctx), 200
+
+chat_pipeline = Pipeline([
+    ("validate", validate_stage),
+    ("gate", gate_stage),
+    ("cache_lookup", cache_lookup_stage),
+    ("analysis", analysis_stage),
+    ("route", route_stage),
+    ("response_cache", response_cache_stage),
+    ("prompt_build", prompt_build_stage),
+    ("llm_call", llm_call_stage),
+    ("persist", persist_stage),
+])
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    try:
+        ctx = ChatContext(request.get_json(silent=True), session)
+        payload, status = chat_pipeline.run(ctx)
+        response = jsonify(payload)
+        response.status_code = status
+        response.headers['Server-Timing'] = ctx.server_timing()
+        return response
+
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+def sse_event(data):
+    return f"data: {json.dumps(data)}\n\n"
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Like /chat, but forwards the Gemini reply as Server-Sent Events while it is generated."""
+    ctx = ChatContext(request.get_json(silent=True), session)
+    try:
+        result = chat_pipeline.run(ctx, stop="llm_call")
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
+    if result is not None:
+        payload, status = result
+        if status != 200:
+            return jsonify(payload), status
+
+        # Answered before the LLM stage (e.g. off-topic): send it as a single chunk
+        def early_reply():
+            yield sse_event({"type": "chunk", "text": payload["reply"]})
+            yield sse_event({"type": "done", "analysis": payload["analysis"]})
+        return Response(early_reply(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    def generate():
+        parts = []
+        started = time.perf_counter()
+        try:
+            def start_stream():
+                logger.debug(f"Streaming request to {ctx.model}")
+                return model_router.track(ctx.route.name, client.models.generate_content_stream(
+                    model=ctx.model,
+                    contents=ctx.contents,
+                    config=ctx.config,
+                ))
+
+            stream = llm_flight.stream(ctx.flight_key, start_stream) if ctx.flight_key else start_stream()
+            for chunk in stream:
+                if chunk.text:
+                    if not parts:
+                        chat_pipeline.stats.record("llm_first_chunk", (time.perf_counter() - started) * 1000)
+                    parts.append(chunk.text)
+                    yield sse_event({"type": "chunk", "text": chunk.text})
+            chat_pipeline.stats.record("llm_stream", (time.perf_counter() - started) * 1000)
+
+            # Commit the full reply to the conversation once the stream is complete
+            ctx.reply = "".join(parts)
+            chat_pipeline.run(ctx, start="persist")
+            yield sse_event({"type": "done", "analysis": ctx.analysis})
+        except Exception as e:
+            logger.error(f"Streaming error: {str(e)}")
+            yield sse_event({"type": "error", "error": f"An unexpected error occurred: {str(e)}"})
+
+    # X-Accel-Buffering stops nginx from holding back chunks
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # Route to fetch conversation history
 @app.route('/history', methods=['GET'])
 def get_history():
     session_id = session.get('session_id')
-    if not session_id or session_id not in conversation_history:
-        return jsonify({"history": []})
-    
-    return jsonify({"history": conversation_history[session_id]})
+    history = session_store.get(session_id) if session_id else None
+    return jsonify({"history": [message.to_dict() for message in history or []]})
 
 # Route to clear conversation history
 @app.route('/clear_history', methods=['POST'])
 def clear_history():
     session_id = session.get('session_id')
-    if session_id and session_id in conversation_history:
-        conversation_history[session_id] = []
+    if session_id and session_id in session_store:
+        session_store.clear(session_id)
+        forget_session(session_id)
     
     return jsonify({"status": "success"})
 
+def metrics_snapshot():
+    """Cache and performance counters shared by the Flask and ASGI apps."""
+    return {
+        "lemma_cache": lemma_cache_stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "llm_single_flight": llm_flight.stats(),
+        "model_routes": model_router.stats(),
+        "summarizer": summarizer.stats(),
+        "history_selection": history_index.stats(),
+        "prompt_cache": prompt_cache.stats(),
+        "session_store": session_store.stats(),
+        "chat_pipeline": chat_pipeline.stats.snapshot()
+    }
+
+# Route to expose cache and performance counters for monitoring
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify(metrics_snapshot())
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""Async (ASGI) serving path for EduBot.
+
+Serves the same page and routes as the Flask app in app.py, but awaits the
+async Gemini client, so a single worker can keep hundreds of LLM calls in
+flight instead of one per thread. Run it with:
+
+    hypercorn asgi_app:app --bind 0.0.0.0:5000
+
+The Flask app (python app.py) keeps working as before. Both share the
+pipeline stages, caches and conversation history defined in app.py. Those
+stages block (NLTK, SQLite or Redis round trips, prompt cache creation), so
+here they run in worker threads and never stall the event loop.
+"""
+import asyncio
+import logging
+import time
+import uuid
+
+from quart import Quart, Response, jsonify, request, session
+
+import app as edubot
+from chat_pipeline import ChatContext, Pipeline
+
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__, static_folder='.', static_url_path='')
+app.secret_key = edubot.app.secret_key
+
+
+async def llm_call_stage(ctx):
+    async def generate():
+        logger.debug(f"Sending async request to {ctx.model}")
+        started = time.perf_counter()
+        response = await edubot.client.aio.models.generate_content(
+            model=ctx.model,
+            contents=ctx.contents,
+            config=ctx.config,
+        )
+        edubot.model_router.record(ctx.route.name, (time.perf_counter() - started) * 1000,
+                                   response.usage_metadata)
+        return response
+
+    if ctx.flight_key:
+        response = await edubot.llm_flight.do_async(ctx.flight_key, generate)
+    else:
+        response = await generate()
+    ctx.reply = response.text
+    logger.debug(f"Received response from Google Gemini: {ctx.reply[:100]}...")
+    return None
+
+
+def in_thread(stage):
+    """Wrap a blocking stage so the event loop awaits it in a worker thread."""
+    async def run(ctx):
+        return await asyncio.to_thread(stage, ctx)
+    return run
+
+
+# The sync pipeline with its blocking LLM stage swapped for the async one
+ASYNC_STAGES = {"llm_call": llm_call_stage}
+chat_pipeline = Pipeline([(name, ASYNC_STAGES.get(name) or in_thread(stage))
+                          for name, stage in edubot.chat_pipeline.stages])
+
+
+@app.route('/')
+async def home():
+    if 'session_id' not in session:
+        session['session_id'] = str(uuid.uuid4())
+    return edubot.HOME_HTML
+
+
+@app.route('/chat', methods=['POST'])
+async def chat():
+    try:
+        ctx = ChatContext(await request.get_json(silent=True), session)
+        payload, status = await chat_pipeline.run_async(ctx)
+        response = jsonify(payload)
+        response.status_code = status
+        response.headers['Server-Timing'] = ctx.server_timing()
+        return response
+
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+
+@app.route('/chat/stream', methods=['POST'])
+async def chat_stream():
+    ctx = ChatContext(await request.get_json(silent=True), session)
+    try:
+        result = await chat_pipeline.run_async(ctx, stop="llm_call")
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+
+    if result is not None:
+        payload, status = result
+        if status != 200:
+            return jsonify(payload), status
+
+        async def early_reply():
+            yield edubot.sse_event({"type": "chunk", "text": payload["reply"]})
+            yield edubot.sse_event({"type": "done", "analysis": payload["analysis"]})
+        return Response(early_reply(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    async def generate():
+        parts = []
+        started = time.perf_counter()
+        try:
+            async def start_stream():
+                logger.debug(f"Streaming async request to {ctx.model}")
+                stream = await edubot.client.aio.models.generate_content_stream(
+                    model=ctx.model,
+                    contents=ctx.contents,
+                    config=ctx.config,
+                )
+                return edubot.model_router.track_async(ctx.route.name, stream)
+
+            if ctx.flight_key:
+                stream = edubot.llm_flight.stream_async(ctx.flight_key, start_stream)
+            else:
+                stream = await start_stream()
+            async for chunk in stream:
+                if chunk.text:
+                    if not parts:
+                        chat_pipeline.stats.record("llm_first_chunk", (time.perf_counter() - started) * 1000)
+                    parts.append(chunk.text)
+                    yield edubot.sse_event({"type": "chunk", "text": chunk.text})
+            chat_pipeline.stats.record("llm_stream", (time.perf_counter() - started) * 1000)
+
+            ctx.reply = "".join(parts)
+            await chat_pipeline.run_async(ctx, start="persist")
+            yield edubot.sse_event({"type": "done", "analysis": ctx.analysis})
+        except Exception as e:
+            logger.error(f"Streaming error: {str(e)}")
+            yield edubot.sse_event({"type": "error", "error": f"An unexpected error occurred: {str(e)}"})
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/history', methods=['GET'])
+async def get_history():
+    session_id = session.get('session_id')
+    history = await asyncio.to_thread(edubot.session_store.get, session_id) if session_id else None
+    return jsonify({"history": [message.to_dict() for message in history or []]})
+
+
+def clear_session(session_id):
+    if session_id in edubot.session_store:
+        edubot.session_store.clear(session_id)
+        edubot.forget_session(session_id)
+
+
+@app.route('/clear_history', methods=['POST'])
+async def clear_history():
+    session_id = session.get('session_id')
+    if session_id:
+        await asyncio.to_thread(clear_session, session_id)
+
+    return jsonify({"status": "success"})
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    snapshot = await asyncio.to_thread(edubot.metrics_snapshot)
+    return jsonify(dict(snapshot, async_chat_pipeline=chat_pipeline.stats.snapshot()))
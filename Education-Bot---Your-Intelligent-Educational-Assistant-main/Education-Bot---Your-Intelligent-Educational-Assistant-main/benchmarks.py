@@ -0,0 +1,537 @@
+"""Micro-benchmarks for the EduBot request path.
+
+Usage:
+    python benchmarks.py                 # list available benchmarks
+    python benchmarks.py pos_tag         # run one benchmark
+    python benchmarks.py pos_tag -n 500  # change the number of iterations
+
+The NLTK benchmarks need the data from 'python nltk_resources.py prefetch'.
+"""
+import argparse
+import inspect
+import sys
+import time
+
+import nltk_resources
+
+BENCHMARKS = {}
+
+SAMPLE_QUERIES = [
+    "Explain quantum physics in simple terms",
+    "Help me solve calculus problems",
+    "Teach me about World War II",
+    "What is the difference between mitosis and meiosis?",
+    "How do I calculate the derivative of x squared times sine of x?",
+    "Why does the moon have phases?",
+    "Analyze the themes in Shakespeare's Hamlet",
+    "Explain object-oriented programming principles",
+]
+
+
+# (message, is educational) pairs used to check the query filter
+LABELED_QUERIES = [
+    ("Explain quantum physics in simple terms", True),
+    ("Help me solve calculus problems", True),
+    ("Teach me about World War II", True),
+    ("What is photosynthesis?", True),
+    ("How does DNA replication work?", True),
+    ("Why is the sky blue?", True),
+    ("Define kinetic energy", True),
+    ("Describe the water cycle", True),
+    ("I want to learn about the Roman Empire", True),
+    ("Can you help me with my algebra homework?", True),
+    ("What are Newton's laws of motion?", True),
+    ("Analyze the themes in Shakespeare's Hamlet for my literature class", True),
+    ("What's the difference between mean and median in statistics", True),
+    ("Programming fundamentals", True),
+    ("Give me tips on study skills for finals", True),
+    ("What was my previous question?", True),
+    ("Can you remember what I asked earlier?", True),
+    ("Show my history", True),
+    ("Who are you", True),
+    ("Tell me a joke", False),
+    ("What's the weather like today", False),
+    ("Book me a flight to Paris", False),
+    ("lol", False),
+    ("Recommend a good pizza place nearby", False),
+    ("Who won the football game last night", False),
+    ("Write my shopping list", False),
+    ("hello there", False),
+    ("Play some music", False),
+    # Cases the regex rules get wrong
+    ("Tell me about mitochondria", True),
+    ("mitochondria function in cells", True),
+    ("Is a tomato a fruit or a vegetable", True),
+    ("How do I make pancakes?", False),
+    ("What is the best pizza topping?", False),
+    ("Can you help me with my resume for a job in retail?", False),
+]
+
+
+def legacy_is_educational_query(query):
+    """The per-pattern re.search implementation that query_filter replaced."""
+    import re
+    from query_filter import EDUCATIONAL_DOMAINS, CHAT_PATTERNS, EDUCATIONAL_PATTERNS
+
+    query_lower = query.lower()
+    for _, pattern in CHAT_PATTERNS:
+        if re.search(pattern, query_lower):
+            return True
+    for domain in EDUCATIONAL_DOMAINS:
+        if domain in query_lower:
+            return True
+    for _, pattern in EDUCATIONAL_PATTERNS:
+        if re.search(pattern, query_lower):
+            return True
+    return False
+
+
+def report_accuracy(label, predict):
+    correct = sum(predict(query) == expected for query, expected in LABELED_QUERIES)
+    print(f"  {label:<48} {correct}/{len(LABELED_QUERIES)} correct ({correct / len(LABELED_QUERIES):.0%})")
+
+
+def benchmark(fn):
+    """Register fn under its name so it can be run from the command line."""
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def time_per_call(fn, iterations):
+    """Return the mean wall-clock seconds per call of fn over iterations calls."""
+    fn()  # exclude one-off setup from the measurement
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def report(label, seconds, baseline=None):
+    line = f"  {label:<48} {seconds * 1e6:12.1f} us/call"
+    if baseline:
+        line += f"   ({baseline / seconds:.1f}x)"
+    print(line)
+
+
+def require_nltk_data():
+    missing = nltk_resources.missing_resources()
+    if missing:
+        sys.exit(f"Missing NLTK resources: {', '.join(missing)}. Run 'python nltk_resources.py prefetch'.")
+
+
+@benchmark
+def pos_tag(iterations):
+    """Per-request POS tagging: nltk.pos_tag() vs. the process-wide tagger."""
+    require_nltk_data()
+    from nltk import pos_tag as nltk_pos_tag
+    from nltk.tag.perceptron import PerceptronTagger
+
+    token_lists = [query.lower().split() for query in SAMPLE_QUERIES]
+
+    def fresh_tagger():
+        # What nltk.pos_tag() does per call on NLTK releases before 3.9
+        for tokens in token_lists:
+            PerceptronTagger().tag(tokens)
+
+    def nltk_default():
+        for tokens in token_lists:
+            nltk_pos_tag(tokens)
+
+    def shared_tagger():
+        tagger = nltk_resources.get_tagger()
+        for tokens in token_lists:
+            tagger.tag(tokens)
+
+    per_query = len(token_lists)
+    before = time_per_call(fresh_tagger, max(1, iterations // 50)) / per_query
+    report("new PerceptronTagger per request", before)
+    report("nltk.pos_tag() (installed NLTK)", time_per_call(nltk_default, iterations) / per_query, before)
+    report("nltk_resources.get_tagger()", time_per_call(shared_tagger, iterations) / per_query, before)
+
+
+LONG_STUDENT_INPUT = "\n\n".join([
+    "I have been reading about the French Revolution for my history class. "
+    "My teacher said the financial crisis was important, but I do not understand why. "
+    "Why did the debt of the monarchy lead to the meeting of the Estates-General?",
+    "Also, how does this compare to the American Revolution? "
+    "Both revolutions talked about liberty and the rights of citizens, "
+    "yet the outcomes were very different for the people involved.",
+    "Finally, could you explain what the Reign of Terror was, who Robespierre was, "
+    "and how the revolution ended with Napoleon taking power? "
+    "I need to write an essay comparing the causes and consequences.",
+] * 3)
+
+
+def legacy_analyze_user_input(text):
+    """The multi-pass analysis that text_analysis.analyze_user_input replaced."""
+    from nltk import pos_tag as nltk_pos_tag
+    from nltk.tokenize import sent_tokenize, word_tokenize
+
+    lemmatizer = nltk_resources.get_lemmatizer()
+    stop_words = nltk_resources.get_stop_words()
+    tokens = word_tokenize(text.lower())
+    meaningful_tokens = [token for token in tokens if token.isalnum() and token not in stop_words]
+    lemmatized_tokens = [lemmatizer.lemmatize(token) for token in meaningful_tokens]
+    pos_tags = nltk_pos_tag(meaningful_tokens)
+    key_concepts = [word for word, pos in pos_tags if pos.startswith('NN') or pos.startswith('JJ')]
+    question_type = "general"
+    if any(word in text.lower() for word in ["what", "define", "explain"]):
+        question_type = "definition"
+    elif any(word in text.lower() for word in ["how", "solve", "calculate"]):
+        question_type = "procedural"
+    elif any(word in text.lower() for word in ["why", "because", "reason"]):
+        question_type = "conceptual"
+    elif any(word in text.lower() for word in ["compare", "difference", "similar"]):
+        question_type = "comparison"
+    sentences = sent_tokenize(text)
+    avg_sentence_length = sum(len(word_tokenize(sentence)) for sentence in sentences) / len(sentences)
+    complexity = "medium"
+    if avg_sentence_length > 15 or len(key_concepts) > 5:
+        complexity = "high"
+    elif avg_sentence_length < 8 and len(key_concepts) < 3:
+        complexity = "low"
+    return {
+        "tokens": lemmatized_tokens,
+        "key_concepts": key_concepts,
+        "question_type": question_type,
+        "complexity": complexity,
+        "sentence_count": len(sentences),
+        "word_count": len(meaningful_tokens)
+    }
+
+
+@benchmark
+def analysis(iterations):
+    """analyze_user_input on short queries and a long multi-paragraph input, old vs. single-pass."""
+    require_nltk_data()
+    from text_analysis import analyze_user_input
+
+    for label, texts in (("short queries", SAMPLE_QUERIES), ("long multi-paragraph input", [LONG_STUDENT_INPUT])):
+        print(f" {label}:")
+        before = time_per_call(lambda: [legacy_analyze_user_input(text) for text in texts], iterations) / len(texts)
+        report("multi-pass (legacy)", before)
+        after = time_per_call(lambda: [analyze_user_input(text) for text in texts], iterations) / len(texts)
+        report("single-pass", after, before)
+
+
+@benchmark
+def query_filter(iterations):
+    """is_educational_query: per-pattern re.search loop vs. the precompiled matcher."""
+    from query_filter import is_educational_query, match_query
+
+    queries = [query for query, _ in LABELED_QUERIES]
+    disagreements = [query for query in queries if legacy_is_educational_query(query) != is_educational_query(query)]
+    print(f"  disagreements with the legacy function: {len(disagreements)}")
+    for query in disagreements:
+        print(f"    {query!r}")
+    report_accuracy("legacy accuracy on labeled corpus", legacy_is_educational_query)
+    report_accuracy("matcher accuracy on labeled corpus", is_educational_query)
+
+    before = time_per_call(lambda: [legacy_is_educational_query(query) for query in queries], iterations) / len(queries)
+    report("per-pattern re.search (legacy)", before)
+    after = time_per_call(lambda: [match_query(query) for query in queries], iterations) / len(queries)
+    report("precompiled matcher", after, before)
+
+
+@benchmark
+def taxonomy(iterations):
+    """Curriculum keyword lookup: linear substring scan vs. Aho-Corasick, by taxonomy size."""
+    import random
+    import string
+    from taxonomy import TaxonomyIndex
+
+    rng = random.Random(0)
+    queries = [query for query, _ in LABELED_QUERIES]
+    for size in (100, 1000, 10000, 100000):
+        terms = [" ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+                          for _ in range(rng.randint(1, 2))) for _ in range(size)]
+        nodes = [(f"subject{i % 50}/topic{i}", [term]) for i, term in enumerate(terms)]
+        index = TaxonomyIndex(nodes)
+        print(f" {size} terms:")
+        scan_iterations = max(1, iterations * 100 // size)
+        before = time_per_call(lambda: [[term for term in terms if term in query.lower()] for query in queries],
+                               scan_iterations) / len(queries)
+        report("linear substring scan", before)
+        after = time_per_call(lambda: [index.best_match(query) for query in queries], iterations) / len(queries)
+        report("Aho-Corasick index", after, before)
+
+
+@benchmark
+def classifier(iterations):
+    """Local query classifier: scoring latency next to the rule-based filter."""
+    from query_classifier import QueryClassifier, evaluation_report
+    from query_filter import rule_based_match
+
+    texts = [query for query, _ in LABELED_QUERIES]
+    labels = [label for _, label in LABELED_QUERIES]
+    # The labeled corpus is far too small for a meaningful accuracy figure; use
+    # 'python query_classifier.py train --holdout' on real data for that
+    model = QueryClassifier.train(texts, labels)
+    accuracy = evaluation_report(model, texts, labels, lambda text: rule_based_match(text) is not None)
+    print(f"  training-set accuracy: model {accuracy['accuracy']:.0%}, "
+          f"rules {accuracy['fallback_only_accuracy']:.0%}, gated {accuracy['gated_accuracy']:.0%}")
+
+    rules = time_per_call(lambda: [rule_based_match(text) for text in texts], iterations) / len(texts)
+    report("rule-based filter", rules)
+    report("classifier predict_proba", time_per_call(lambda: [model.predict_proba(text) for text in texts],
+                                                      iterations) / len(texts))
+
+
+@benchmark
+def semantic_cache(iterations, entries=1_000_000):
+    """Near-duplicate (MinHash/LSH) answer cache: lookup latency with many cached entries."""
+    import random
+    import string
+    from semantic_cache import SemanticCache
+
+    rng = random.Random(0)
+    vocabulary = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(50000)]
+    cache = SemanticCache(max_entries=entries)
+    stored = []
+    start = time.perf_counter()
+    for i in range(entries):
+        lemmas = rng.sample(vocabulary, rng.randint(2, 6))
+        cache.put(lemmas, "definition", f"answer {i}")
+        if i % max(1, entries // 1000) == 0:
+            stored.append(lemmas)
+    print(f"  built {entries} entries in {time.perf_counter() - start:.1f}s")
+
+    def with_synonym(lemmas):
+        position = rng.randrange(len(lemmas))
+        return lemmas[:position] + [rng.choice(vocabulary)] + lemmas[position + 1:]
+
+    def reordered(lemmas):
+        position = rng.randrange(len(lemmas) - 1)
+        return lemmas[:position] + [lemmas[position + 1], lemmas[position]] + lemmas[position + 2:]
+
+    # Only the first kind is an exact match once instruction words are dropped
+    paraphrases = {
+        "instruction word added": [["explain"] + lemmas for lemmas in stored],
+        "extra content lemma": [lemmas + [rng.choice(vocabulary)] for lemmas in stored],
+        "one lemma replaced (synonym)": [with_synonym(lemmas) for lemmas in stored],
+        "two neighbouring lemmas swapped": [reordered(lemmas) for lemmas in stored],
+    }
+    unseen = [rng.sample(vocabulary, rng.randint(2, 6)) for _ in range(len(stored))]
+    print(f"  hit rate at threshold {cache.threshold}:")
+    for label, queries in paraphrases.items():
+        hits = sum(cache.get(lemmas, "definition") is not None for lemmas in queries)
+        print(f"    {label:<34} {hits}/{len(queries)}")
+    near_duplicates = [lemmas for label, queries in paraphrases.items() if label != "instruction word added"
+                       for lemmas in queries]
+    report("lookup, exact paraphrase", time_per_call(
+        lambda: [cache.get(lemmas, "definition") for lemmas in paraphrases["instruction word added"]],
+        iterations) / len(stored))
+    report("lookup, near-duplicate paraphrase", time_per_call(
+        lambda: [cache.get(lemmas, "definition") for lemmas in near_duplicates], iterations) / len(near_duplicates))
+    report("lookup, unseen question (miss)", time_per_call(
+        lambda: [cache.get(lemmas, "definition") for lemmas in unseen], iterations) / len(unseen))
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_session_writers(store, writers, operations):
+    """Each writer thread appends a turn to its own session and reads it back; returns per-call latencies."""
+    import threading
+    from message import turn
+
+    appends, reads = [], []
+    lock = threading.Lock()
+
+    def writer(number):
+        session_id = f"bench-{number}"
+        store.create(session_id)
+        local_appends, local_reads = [], []
+        for i in range(operations):
+            start = time.perf_counter()
+            store.append(session_id, *turn(f"Question {i} about photosynthesis", "An answer of a few sentences. " * 20))
+            local_appends.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            store.get(session_id)
+            local_reads.append(time.perf_counter() - start)
+        with lock:
+            appends.extend(local_appends)
+            reads.extend(local_reads)
+
+    threads = [threading.Thread(target=writer, args=(number,)) for number in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return appends, reads, time.perf_counter() - start
+
+
+@benchmark
+def session_store(iterations, entries=16):
+    """Session store append/read latency (p50/p99) under concurrent writer threads."""
+    import os
+    import tempfile
+    from session_store import InMemorySessionStore, SQLiteSessionStore
+
+    writers = entries
+    with tempfile.TemporaryDirectory() as directory:
+        stores = [
+            ("memory", InMemorySessionStore()),
+            ("sqlite, one transaction per append", SQLiteSessionStore(os.path.join(directory, "single.db"), max_batch=1)),
+            ("sqlite, batched appends", SQLiteSessionStore(os.path.join(directory, "batched.db"))),
+        ]
+        print(f"  {writers} writer threads x {iterations} turns each")
+        for label, store in stores:
+            appends, reads, elapsed = run_session_writers(store, writers, iterations)
+            print(f"  {label:<48} append p50 {percentile(appends, 0.5) * 1e6:8.0f} us"
+                  f"  p99 {percentile(appends, 0.99) * 1e6:8.0f} us"
+                  f"  | read p50 {percentile(reads, 0.5) * 1e6:6.0f} us  p99 {percentile(reads, 0.99) * 1e6:6.0f} us"
+                  f"  | {len(appends) / elapsed:8.0f} appends/s")
+            if hasattr(store, "batches"):
+                print(f"  {'':<48} avg batch size {store.stats()['avg_batch_size']:.1f}")
+
+
+@benchmark
+def session_memory(iterations, entries=100_000):
+    """Per-session history containers: re-sliced lists vs. ring buffers, at many sessions."""
+    import tracemalloc
+    from itertools import islice
+    from history_ring import HistoryRing
+    from message import Message, turn
+    from session_store import InMemorySessionStore
+
+    # Message objects are shared, so only the containers are measured
+    turns = [turn(f"Question {i}", f"Answer {i}") for i in range(12)]
+    session_ids = [f"session-{number:08d}" for number in range(entries)]
+
+    def legacy():
+        history = {session_id: [] for session_id in session_ids}
+
+        def append(session_id, *messages):
+            history[session_id].extend(messages)
+            if len(history[session_id]) > 20:
+                history[session_id] = history[session_id][-20:]
+        return history, append
+
+    def rings():
+        history = {session_id: HistoryRing(20) for session_id in session_ids}
+
+        def append(session_id, *messages):
+            history[session_id].extend(messages)
+        return history, append
+
+    def store():
+        sessions = InMemorySessionStore(max_sessions=entries, max_bytes=1 << 40)
+        return sessions, sessions.append
+
+    def build(make):
+        """Seconds per appended turn, and bytes allocated per session (measured separately)."""
+        tracemalloc.start()
+        container, append = make()
+        for turn in turns:
+            for session_id in session_ids:
+                append(session_id, *turn)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del container, append
+
+        container, append = make()
+        start = time.perf_counter()
+        for turn in turns:
+            for session_id in session_ids:
+                append(session_id, *turn)
+        return (time.perf_counter() - start) / (entries * len(turns)), size / entries, container
+
+    print(f"  {entries} sessions, {len(turns)} turns each (history capped at 20 messages)")
+    legacy_seconds, legacy_bytes, legacy_history = build(legacy)
+    ring_seconds, ring_bytes, ring_history = build(rings)
+    store_seconds, store_bytes, sessions = build(store)
+    report("append turn, list + re-slice", legacy_seconds)
+    report("append turn, HistoryRing", ring_seconds, legacy_seconds)
+    report("append turn, InMemorySessionStore (locking, LRU)", store_seconds, legacy_seconds)
+    print(f"  memory per session: list {legacy_bytes:.0f} B, ring {ring_bytes:.0f} B, store {store_bytes:.0f} B")
+    print(f"  store's own estimate incl. messages: {sessions.memory_report()['avg_bytes_per_session']:.0f} B per session")
+
+    current = Message.user("Next question")
+    history, ring = legacy_history[session_ids[0]], ring_history[session_ids[0]]
+    report("prompt window, (history + [msg])[-10:]", time_per_call(
+        lambda: [message.content for message in (history + [current])[-10:]], iterations))
+    report("prompt window, reversed(ring) walk", time_per_call(
+        lambda: [message.content for message in islice(reversed(ring), 9)][::-1] + [current.content], iterations))
+
+
+@benchmark
+def message_memory(iterations, entries=200_000):
+    """History message records: {"role", "content"} dicts vs. __slots__ Message objects."""
+    import json
+    import tracemalloc
+    from message import Message, turn
+
+    # Every record gets its own text, as messages decoded from a store would
+    texts = [(f"Question {i} about photosynthesis", f"Answer {i}: plants turn light into sugar.")
+             for i in range(entries // 2)]
+
+    def dicts():
+        records = []
+        for question, answer in texts:
+            records.append({"role": "user", "content": question})
+            records.append({"role": "assistant", "content": answer})
+        return records
+
+    def messages():
+        records = []
+        for question, answer in texts:
+            records.extend(turn(question, answer))
+        return records
+
+    def measure(build):
+        """Bytes per record, excluding the text itself."""
+        tracemalloc.start()
+        records = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return size / len(records), records
+
+    dict_bytes, dict_records = measure(dicts)
+    message_bytes, message_records = measure(messages)
+    print(f"  {len(dict_records)} records")
+    print(f"  per record: dict {dict_bytes:.0f} B, Message {message_bytes:.0f} B (with timestamp)")
+    saved = (dict_bytes - message_bytes) * 100_000 * 20 / 2 ** 20
+    print(f"  at 100k sessions x 20 messages: {saved:.0f} MiB less")
+
+    dict_seconds = time_per_call(
+        lambda: ({"role": "user", "content": "q"}, {"role": "assistant", "content": "a"}), iterations * 100)
+    report("build turn, two dicts", dict_seconds)
+    report("build turn, turn() Messages", time_per_call(lambda: turn("q", "a"), iterations * 100), dict_seconds)
+    window = slice(-20, None)
+    dict_seconds = time_per_call(lambda: json.dumps(dict_records[window]), iterations)
+    report("serialize 20 for /history, dicts", dict_seconds)
+    report("serialize 20 for /history, Message.to_dict", time_per_call(
+        lambda: json.dumps([message.to_dict() for message in message_records[window]]), iterations), dict_seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run EduBot micro-benchmarks.")
+    parser.add_argument('name', nargs='?', choices=sorted(BENCHMARKS), help="benchmark to run")
+    parser.add_argument('-n', '--iterations', type=int, default=200, help="iterations per measurement")
+    parser.add_argument('--entries', type=int, help="data size for the benchmarks that build large structures "
+                                                      "(semantic_cache, session_memory, message_memory; "
+                                                      "writer threads for session_store)")
+    args = parser.parse_args(argv)
+
+    if not args.name:
+        for name in sorted(BENCHMARKS):
+            print(f"{name:<20} {BENCHMARKS[name].__doc__}")
+        return 0
+
+    if args.entries and 'entries' not in inspect.signature(BENCHMARKS[args.name]).parameters:
+        parser.error(f"--entries is not supported by the {args.name} benchmark")
+
+    print(f"{args.name}: {BENCHMARKS[args.name].__doc__}")
+    if args.entries:
+        BENCHMARKS[args.name](args.iterations, entries=args.entries)
+    else:
+        BENCHMARKS[args.name](args.iterations)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""Bounded in-memory caches with an optional SQLite tier shared between workers."""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """Canonical form of user input used for cache keys (NFC, collapsed whitespace)."""
+    return " ".join(unicodedata.normalize('NFC', text).split())
+
+
+def content_key(*parts):
+    """Stable hash of the given string parts, usable as a cache key."""
+    return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+
+class BoundedTTLCache:
+    """Thread-safe LRU cache of string values with a TTL and a total size bound.
+
+    An entry expires ttl seconds after it was stored. Least recently used
+    entries are evicted once max_entries or max_bytes (UTF-8 size of keys and
+    values) would be exceeded.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Store value under key. Returns False if the value alone exceeds max_bytes."""
+        size = len(key) + len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class SQLiteCacheTier:
+    """Key/value cache in a SQLite file so several worker processes share entries.
+
+    Failures are logged and treated as cache misses; the cache is never allowed
+    to break a request. Every purge_every writes, expired rows are deleted and
+    the table is cut back to the max_rows most recently written ones.
+    """
+
+    def __init__(self, path, ttl=3600, table='cache', max_rows=100000, purge_every=1000):
+        self.path = path
+        self.ttl = ttl
+        self.table = table
+        self.max_rows = max_rows
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.purged = 0
+        self._sql_get = f"SELECT value, expires_at FROM {table} WHERE key = ?"
+        self._sql_set = f"INSERT OR REPLACE INTO {table} (key, value, expires_at) VALUES (?, ?, ?)"
+        self._sql_purge = f"DELETE FROM {table} WHERE expires_at <= ?"
+        # Rows share one TTL, so the latest expiry is the latest write
+        self._sql_trim = (f"DELETE FROM {table} WHERE rowid IN "
+                          f"(SELECT rowid FROM {table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?)")
+        conn = self._connection()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table} (expires_at)")
+        self.purge_expired()
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._connection().execute(self._sql_get, (key,)).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"SQLite cache read failed: {e}")
+            return None
+        if row is None or row[1] <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, key, value):
+        try:
+            self._connection().execute(self._sql_set, (key, value, time.time() + self.ttl))
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"SQLite cache write failed: {e}")
+        self._writes += 1
+        if self.purge_every and self._writes % self.purge_every == 0:
+            self.purge_expired()
+
+    def purge_expired(self):
+        """Delete expired rows and everything beyond max_rows; returns the number of rows deleted."""
+        try:
+            conn = self._connection()
+            deleted = conn.execute(self._sql_purge, (time.time(),)).rowcount
+            if self.max_rows:
+                deleted += conn.execute(self._sql_trim, (self.max_rows,)).rowcount
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"SQLite cache purge failed: {e}")
+            return 0
+        self.purged += deleted
+        return deleted
+
+    def stats(self):
+        return {"path": self.path, "hits": self.hits, "misses": self.misses, "errors": self.errors,
+                "purged": self.purged, "max_rows": self.max_rows}
+
+
+class AnalysisCache:
+    """Content-addressed cache of analyze_user_input results.
+
+    Entries are keyed by a hash of the normalized input and stored as JSON, so
+    every lookup hands out a fresh dict. The in-memory tier is checked first,
+    then the optional SQLite tier shared with other workers.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    @classmethod
+    def from_env(cls):
+        ttl = int(os.getenv('ANALYSIS_CACHE_TTL', '3600'))
+        memory = BoundedTTLCache(
+            max_entries=int(os.getenv('ANALYSIS_CACHE_ENTRIES', '10000')),
+            max_bytes=int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', str(16 * 1024 * 1024))),
+            ttl=ttl,
+        )
+        disk = None
+        db_path = os.getenv('ANALYSIS_CACHE_DB')
+        if db_path:
+            try:
+                disk = SQLiteCacheTier(db_path, ttl=ttl, table='analysis_cache',
+                                       max_rows=int(os.getenv('ANALYSIS_CACHE_DB_MAX_ROWS', '100000')))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not open analysis cache database {db_path}: {e}")
+        return cls(memory, disk)
+
+    @staticmethod
+    def key(text):
+        return content_key(normalize_text(text))
+
+    def get(self, text):
+        """Return the cached analysis for text, or None."""
+        key = self.key(text)
+        value = self.memory.get(key)
+        if value is None and self.disk:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return json.loads(value) if value is not None else None
+
+    def put(self, text, analysis):
+        # The fallback result (NLTK unavailable or failed) has no counts; don't keep it
+        if "sentence_count" not in analysis:
+            return
+        key = self.key(text)
+        value = json.dumps(analysis)
+        self.memory.set(key, value)
+        if self.disk:
+            self.disk.set(key, value)
+
+    def stats(self):
+        stats = {"memory": self.memory.stats()}
+        if self.disk:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+class ResponseCache:
+    """Exact-match cache of Gemini answers.
+
+    Keys combine the normalized, case-folded question with the model name and
+    generation settings, so a change in configuration never serves a stale
+    answer. With first_turn_only (the default) questions asked after earlier
+    turns bypass the cache, since their answers depend on the history.
+    """
+
+    def __init__(self, memory, first_turn_only=True):
+        self.memory = memory
+        self.first_turn_only = first_turn_only
+        self.bypasses = 0
+
+    @classmethod
+    def from_env(cls):
+        memory = BoundedTTLCache(
+            max_entries=int(os.getenv('RESPONSE_CACHE_ENTRIES', '5000')),
+            max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+            ttl=int(os.getenv('RESPONSE_CACHE_TTL', '86400')),
+        )
+        first_turn_only = os.getenv('RESPONSE_CACHE_FIRST_TURN_ONLY', '1').lower() not in ('0', 'false', 'no')
+        return cls(memory, first_turn_only)
+
+    @property
+    def enabled(self):
+        return self.memory.max_entries > 0
+
+    @staticmethod
+    def key(user_input, model, generation_settings):
+        return content_key(
+            normalize_text(user_input).casefold(),
+            model,
+            json.dumps(generation_settings, sort_keys=True),
+        )
+
+    def applies_to(self, history):
+        """Whether a question following history may be answered from the cache."""
+        if not self.enabled:
+            return False
+        if self.first_turn_only and history:
+            self.bypasses += 1
+            return False
+        return True
+
+    def get(self, key):
+        return self.memory.get(key)
+
+    def put(self, key, reply):
+        if reply:
+            self.memory.set(key, reply)
+
+    def stats(self):
+        return dict(self.memory.stats(), bypasses=self.bypasses, first_turn_only=self.first_turn_only)
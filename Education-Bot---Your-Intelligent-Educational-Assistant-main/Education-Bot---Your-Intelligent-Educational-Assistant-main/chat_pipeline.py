@@ -0,0 +1,119 @@
+"""Ordered request pipeline with early exit and per-stage timing.
+
+A stage is a function taking the ChatContext. It returns None to hand over
+to the next stage, or a (payload, status) tuple that ends the request, so
+cheap stages (validation, off-topic gate, caches) can answer before the
+expensive ones run.
+"""
+import inspect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ChatContext:
+    """State shared by the stages handling one chat request."""
+
+    def __init__(self, data, session):
+        self.data = data
+        self.session = session
+        self.session_id = None
+        self.user_input = None
+        self.history = None
+        self.matched_rule = None
+        self.analysis = None
+        self.route = None
+        self.model = None
+        self.generation_settings = None
+        self.contents = None
+        self.config = None
+        self.response_cache_key = None
+        self.paraphrase_safe = False
+        self.flight_key = None
+        self.reply = None
+        self.reply_cached = False
+        self.timings = {}  # stage name -> milliseconds
+        self.exit_stage = None
+
+    def server_timing(self):
+        """Timings formatted for the Server-Timing response header."""
+        return ", ".join(f"{name};dur={duration:.3f}" for name, duration in self.timings.items())
+
+
+class StageStats:
+    """Thread-safe per-stage call counts, durations and early exits."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._exits = {}
+
+    def record(self, name, milliseconds):
+        with self._lock:
+            stats = self._stages.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["calls"] += 1
+            stats["total_ms"] += milliseconds
+            stats["max_ms"] = max(stats["max_ms"], milliseconds)
+
+    def record_exit(self, name):
+        with self._lock:
+            self._exits[name] = self._exits.get(name, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            stages = {
+                name: dict(stats, avg_ms=stats["total_ms"] / stats["calls"])
+                for name, stats in self._stages.items()
+            }
+            return {"stages": stages, "exits": dict(self._exits)}
+
+
+class Pipeline:
+    """Runs named stages in order until one of them produces a response."""
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.stats = StageStats()
+
+    def _select(self, start, stop):
+        names = [name for name, _ in self.stages]
+        first = names.index(start) if start else 0
+        last = names.index(stop) if stop else len(names)
+        return self.stages[first:last]
+
+    def _finish_stage(self, ctx, name, started, result):
+        elapsed = (time.perf_counter() - started) * 1000
+        ctx.timings[name] = elapsed
+        self.stats.record(name, elapsed)
+        if result is not None:
+            ctx.exit_stage = name
+            self.stats.record_exit(name)
+            logger.debug(f"Pipeline finished at '{name}': {ctx.server_timing()}")
+
+    def run(self, ctx, start=None, stop=None):
+        """Run stages from start up to (not including) stop.
+
+        Returns the first stage result that isn't None, or None if every
+        selected stage handed over.
+        """
+        for name, stage in self._select(start, stop):
+            started = time.perf_counter()
+            result = stage(ctx)
+            self._finish_stage(ctx, name, started, result)
+            if result is not None:
+                return result
+        return None
+
+    async def run_async(self, ctx, start=None, stop=None):
+        """Like run, but awaits stages that are coroutine functions."""
+        for name, stage in self._select(start, stop):
+            started = time.perf_counter()
+            result = stage(ctx)
+            if inspect.isawaitable(result):
+                result = await result
+            self._finish_stage(ctx, name, started, result)
+            if result is not None:
+                return result
+        return None
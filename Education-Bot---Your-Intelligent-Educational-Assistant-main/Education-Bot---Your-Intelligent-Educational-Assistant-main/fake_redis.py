@@ -0,0 +1,162 @@
+"""In-process stand-in for the part of the Redis API the session store uses.
+
+FakeRedis speaks the same method names, arguments and return values as
+redis-py for RPUSH, LRANGE, LTRIM, EXPIRE, EXISTS and DELETE, including
+MULTI/EXEC pipelines, so RedisSessionStore can run without a server
+(REDIS_URL=memory://). An optional latency per round trip, checked against
+socket_timeout, makes slow-store behaviour reproducible.
+"""
+import threading
+import time
+
+
+class FakeRedis:
+    def __init__(self, latency=0.0, socket_timeout=None):
+        self.latency = latency
+        self.socket_timeout = socket_timeout
+        self._lock = threading.Lock()
+        self._lists = {}  # key -> list of bytes
+        self._expires = {}  # key -> monotonic deadline
+        self.round_trips = 0
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            if self.socket_timeout is not None and self.latency > self.socket_timeout:
+                time.sleep(self.socket_timeout)
+                raise TimeoutError("Timeout reading from fake redis")
+            time.sleep(self.latency)
+
+    def _live(self, key):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._lists.pop(key, None)
+            self._expires.pop(key, None)
+        return self._lists.get(key)
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode('utf-8')
+
+    @staticmethod
+    def _slice(length, start, end):
+        if start < 0:
+            start = max(length + start, 0)
+        if end < 0:
+            end = length + end
+        return start, min(end, length - 1)
+
+    # Commands, applied under the lock; each returns what redis-py would
+
+    def _rpush(self, key, *values):
+        items = self._live(key)
+        if items is None:
+            items = self._lists[key] = []
+        items.extend(self._encode(value) for value in values)
+        return len(items)
+
+    def _lrange(self, key, start, end):
+        items = self._live(key) or []
+        start, end = self._slice(len(items), start, end)
+        return items[start:end + 1] if start <= end else []
+
+    def _ltrim(self, key, start, end):
+        items = self._live(key)
+        if items is not None:
+            start, end = self._slice(len(items), start, end)
+            items[:] = items[start:end + 1] if start <= end else []
+            if not items:
+                del self._lists[key]
+                self._expires.pop(key, None)
+        return True
+
+    def _expire(self, key, seconds):
+        if self._live(key) is None:
+            return False
+        self._expires[key] = time.monotonic() + seconds
+        return True
+
+    def _exists(self, *keys):
+        return sum(self._live(key) is not None for key in keys)
+
+    def _delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self._live(key) is not None:
+                del self._lists[key]
+                self._expires.pop(key, None)
+                deleted += 1
+        return deleted
+
+    def _call(self, name, *args):
+        self._round_trip()
+        with self._lock:
+            return getattr(self, f"_{name}")(*args)
+
+    def rpush(self, key, *values):
+        return self._call("rpush", key, *values)
+
+    def lrange(self, key, start, end):
+        return self._call("lrange", key, start, end)
+
+    def ltrim(self, key, start, end):
+        return self._call("ltrim", key, start, end)
+
+    def expire(self, key, seconds):
+        return self._call("expire", key, seconds)
+
+    def exists(self, *keys):
+        return self._call("exists", *keys)
+
+    def delete(self, *keys):
+        return self._call("delete", *keys)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def close(self):
+        pass
+
+
+class FakePipeline:
+    """Queues commands and runs them in one round trip, atomically."""
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._commands = []
+
+    def _queue(self, name, *args):
+        self._commands.append((name, args))
+        return self
+
+    def rpush(self, key, *values):
+        return self._queue("rpush", key, *values)
+
+    def lrange(self, key, start, end):
+        return self._queue("lrange", key, start, end)
+
+    def ltrim(self, key, start, end):
+        return self._queue("ltrim", key, start, end)
+
+    def expire(self, key, seconds):
+        return self._queue("expire", key, seconds)
+
+    def exists(self, *keys):
+        return self._queue("exists", *keys)
+
+    def delete(self, *keys):
+        return self._queue("delete", *keys)
+
+    def execute(self):
+        client = self._client
+        client._round_trip()
+        with client._lock:
+            results = [getattr(client, f"_{name}")(*args) for name, args in self._commands]
+        self._commands = []
+        return results
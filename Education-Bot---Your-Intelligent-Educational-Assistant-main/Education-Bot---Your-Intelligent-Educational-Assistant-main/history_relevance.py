@@ -0,0 +1,178 @@
+"""Relevance-ranked selection of earlier turns for the Gemini prompt.
+
+Each session has an inverted index from lemma to the turns (a student
+message plus the replies to it) that contain it. The index follows the
+session's history list incrementally: new messages at the end are indexed
+once, and messages trimmed from the front are removed. Messages are
+matched by role and content, so stores that hand out fresh copies on every
+read (SQLite) keep their index too. For a new question, earlier turns are scored by TF-IDF over the
+question's lemmas and key concepts; the best ones are sent in their
+original order within the token budget. The latest turn is always sent,
+since follow-ups like "give me another example" depend on it.
+"""
+import logging
+import math
+import threading
+from collections import Counter
+from itertools import islice
+
+from history_window import message_tokens, select_history
+from semantic_cache import signature_items
+from text_analysis import content_lemmas, lemmatize
+
+logger = logging.getLogger(__name__)
+
+# Key concepts count this many times over plain lemmas of the question
+KEY_CONCEPT_WEIGHT = 2.0
+
+
+def _message_key(message):
+    return message.role, message.content
+
+
+class _Turn:
+    __slots__ = ('turn_id', 'messages', 'terms', 'tokens')
+
+    def __init__(self, turn_id):
+        self.turn_id = turn_id
+        self.messages = []
+        self.terms = Counter()
+        self.tokens = 0
+
+
+class SessionIndex:
+    """Inverted index over the turns of one session's history.
+
+    Not thread-safe; callers hold `lock` around sync() and select().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._turns = []  # oldest first
+        self._postings = {}  # lemma -> {turn_id: term frequency}
+        self._next_turn_id = 0
+
+    def _remove_turn(self, turn):
+        for term in turn.terms:
+            postings = self._postings[term]
+            del postings[turn.turn_id]
+            if not postings:
+                del self._postings[term]
+
+    def _index(self, turn, message):
+        terms = Counter(content_lemmas(message.content))
+        for term, count in terms.items():
+            postings = self._postings.setdefault(term, {})
+            postings[turn.turn_id] = postings.get(turn.turn_id, 0) + count
+        turn.terms.update(terms)
+        turn.messages.append(message)
+        turn.tokens += message_tokens(message)
+
+    def sync(self, history):
+        """Bring the index in line with history (a sequence that is appended to and trimmed from the front)."""
+        indexed = [message for turn in self._turns for message in turn.messages]
+        alive = {_message_key(message) for message in history}
+        # Drop turns whose messages were trimmed; a turn goes once its first message is gone
+        while self._turns and _message_key(self._turns[0].messages[0]) not in alive:
+            turn = self._turns.pop(0)
+            self._remove_turn(turn)
+            indexed = indexed[len(turn.messages):]
+        kept = len(indexed)
+        if kept and (kept > len(history) or _message_key(history[kept - 1]) != _message_key(indexed[-1])
+                     or _message_key(history[0]) != _message_key(indexed[0])):
+            # Not a trim/append of what we indexed (e.g. history was replaced): start over
+            for turn in self._turns:
+                self._remove_turn(turn)
+            self._turns = []
+            kept = 0
+
+        for message in islice(history, kept, None):
+            if message.role == "user" or not self._turns:
+                self._turns.append(_Turn(self._next_turn_id))
+                self._next_turn_id += 1
+            self._index(self._turns[-1], message)
+
+    def score(self, query_weights):
+        """TF-IDF score of every turn for {lemma: weight}; turns without a match are left out."""
+        total = len(self._turns)
+        scores = {}
+        for term, weight in query_weights.items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log((total + 1) / len(postings))
+            for turn_id, count in postings.items():
+                scores[turn_id] = scores.get(turn_id, 0.0) + weight * (1 + math.log(count)) * idf
+        return scores
+
+    def select(self, query_weights, budget):
+        """Messages of the latest turn plus the most relevant earlier ones, oldest first, within budget."""
+        if not self._turns:
+            return []
+        latest = self._turns[-1]
+        remaining = budget - latest.tokens
+        scores = self.score(query_weights)
+        chosen = {latest.turn_id}
+        ranked = sorted(self._turns[:-1], key=lambda turn: (scores.get(turn.turn_id, 0.0), turn.turn_id), reverse=True)
+        for turn in ranked:
+            if scores.get(turn.turn_id, 0.0) <= 0.0:
+                break
+            if turn.tokens <= remaining:
+                chosen.add(turn.turn_id)
+                remaining -= turn.tokens
+        return [message for turn in self._turns if turn.turn_id in chosen for message in turn.messages]
+
+
+class HistoryRelevanceIndex:
+    """Per-session SessionIndex objects, kept in step with the session store."""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # guards _sessions and the counters only
+        self._sessions = {}
+        self.selections = 0
+        self.messages_available = 0
+        self.messages_sent = 0
+
+    def select(self, session_id, history, analysis, current_message, budget):
+        """The messages to send for current_message: the latest turn, relevant earlier turns and current_message.
+
+        Earlier turns that share no lemma with the question are left out even
+        when they would fit. Messages keep their original order.
+        """
+        query_weights = {term: 1.0 for term in signature_items(analysis.get("tokens", []))}
+        for concept in analysis.get("key_concepts", []):
+            term = lemmatize(concept.lower())
+            if term in query_weights:
+                query_weights[term] = KEY_CONCEPT_WEIGHT
+
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is None:
+                index = self._sessions[session_id] = SessionIndex()
+        # Indexing new replies runs NLTK; only requests of the same session wait for it
+        with index.lock:
+            index.sync(history)
+            earlier = index.select(query_weights, budget - message_tokens(current_message))
+        if sum(message_tokens(message) for message in earlier) + message_tokens(current_message) > budget:
+            # The latest turn alone is over budget: fall back to trimming by recency
+            selected = select_history(history, current_message, budget)
+        else:
+            selected = earlier + [current_message]
+        logger.debug(f"Relevant history: {len(selected)} of {len(history) + 1} messages")
+        with self._lock:
+            self.selections += 1
+            self.messages_available += len(history) + 1
+            self.messages_sent += len(selected)
+        return selected
+
+    def forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "selections": self.selections,
+                "messages_sent_ratio": self.messages_sent / self.messages_available if self.messages_available else 0.0
+            }
@@ -0,0 +1,94 @@
+"""Fixed-capacity ring buffer for a session's recent messages.
+
+Appending to a full HistoryRing overwrites the oldest slot in place and
+hands the overwritten message back, so keeping "the last 20 messages" never
+copies or shifts a list. Prompt building reads the newest messages with
+reversed(), which walks the ring in place, so it never copies either.
+"""
+import sys
+from collections.abc import Sequence
+
+
+class HistoryRing(Sequence):
+    """The last `capacity` items appended, oldest first."""
+
+    __slots__ = ('_items', '_start', '_size')
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self._items = [None] * capacity
+        self._start = 0
+        self._size = 0
+
+    @property
+    def capacity(self):
+        return len(self._items)
+
+    def __len__(self):
+        return self._size
+
+    def _slot(self, index):
+        return (self._start + index) % len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("history index out of range")
+        return self._items[self._slot(index)]
+
+    def __iter__(self):
+        items, capacity = self._items, len(self._items)
+        for i in range(self._start, self._start + self._size):
+            yield items[i % capacity]
+
+    def __reversed__(self):
+        items, capacity = self._items, len(self._items)
+        for i in range(self._start + self._size - 1, self._start - 1, -1):
+            yield items[i % capacity]
+
+    def append(self, item):
+        """Add item as the newest entry; returns the entry it pushed out, or None."""
+        capacity = len(self._items)
+        if self._size < capacity:
+            self._items[(self._start + self._size) % capacity] = item
+            self._size += 1
+            return None
+        evicted = self._items[self._start]
+        self._items[self._start] = item
+        self._start = (self._start + 1) % capacity
+        return evicted
+
+    def extend(self, new_items):
+        """Append each of new_items; returns the list of entries pushed out, oldest first."""
+        items = self._items
+        capacity = len(items)
+        start, size = self._start, self._size
+        evicted = []
+        for item in new_items:
+            if size < capacity:
+                slot = start + size
+                items[slot - capacity if slot >= capacity else slot] = item
+                size += 1
+            else:
+                evicted.append(items[start])
+                items[start] = item
+                start = start + 1 if start + 1 < capacity else 0
+        self._start, self._size = start, size
+        return evicted
+
+    def clear(self):
+        self._items = [None] * len(self._items)
+        self._start = 0
+        self._size = 0
+
+    def overhead_bytes(self):
+        """Memory of the ring itself, not counting the items."""
+        return sys.getsizeof(self) + sys.getsizeof(self._items)
+
+    def __repr__(self):
+        return f"HistoryRing({list(self)!r}, capacity={len(self._items)})"
+
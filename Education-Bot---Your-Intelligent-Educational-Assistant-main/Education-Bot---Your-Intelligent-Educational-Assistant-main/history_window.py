@@ -0,0 +1,82 @@
+"""Token-budgeted selection of the conversation history sent to Gemini.
+
+Messages are packed newest first until the budget is spent. The message
+being answered is always sent whole; the first older message that does not
+fit is cut down to the remaining budget (if enough is left to be useful)
+and everything older is dropped. Token counts are estimated locally from
+the text length, which is close enough to keep prompt size predictable
+without calling a tokenizer.
+"""
+import logging
+import os
+import re
+
+from message import Message
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', '2000'))
+
+# Gemini averages about 4 characters per token on English prose
+CHARS_PER_TOKEN = 4
+# Role marker and turn separators added around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Don't bother sending a trimmed message shorter than this
+MIN_TRIMMED_TOKENS = 32
+TRIM_MARKER = " [...]"
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def estimate_tokens(text):
+    """Rough token count of text: about one per 4 characters, at least one per word."""
+    if not text:
+        return 0
+    return max(-(-len(text) // CHARS_PER_TOKEN), len(_WORD_RE.findall(text)))
+
+
+def message_tokens(message):
+    """Estimated tokens of a Message, cached on it after the first call."""
+    if message.tokens is None:
+        message.tokens = estimate_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+    return message.tokens
+
+
+def trim_message(message, tokens):
+    """Copy of message cut at a word boundary to about tokens tokens, or None if too short."""
+    tokens -= MESSAGE_OVERHEAD_TOKENS
+    if tokens < MIN_TRIMMED_TOKENS:
+        return None
+    content = message.content
+    cut = content[:tokens * CHARS_PER_TOKEN - len(TRIM_MARKER)]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    while cut and estimate_tokens(cut + TRIM_MARKER) > tokens:
+        cut = cut[:-CHARS_PER_TOKEN]
+    return Message(message.role, cut + TRIM_MARKER, message.timestamp) if cut else None
+
+
+def select_history(history, current_message, budget=HISTORY_TOKEN_BUDGET):
+    """current_message preceded by the newest history messages that fit in budget tokens.
+
+    current_message (the one being answered) is always included. history
+    only needs to support len() and reversed(), so ring buffer views work
+    without being copied.
+    """
+    selected = [current_message]
+    remaining = budget - message_tokens(current_message)
+    for message in reversed(history):
+        cost = message_tokens(message)
+        if cost <= remaining:
+            selected.append(message)
+            remaining -= cost
+            continue
+        trimmed = trim_message(message, remaining)
+        if trimmed is not None:
+            selected.append(trimmed)
+            remaining -= message_tokens(trimmed)
+        break
+    selected.reverse()
+    logger.debug(f"History window: {len(selected)} of {len(history) + 1} messages, "
+                 f"~{budget - remaining} of {budget} tokens")
+    return selected
@@ -0,0 +1,48 @@
+"""Compact record for one conversation message.
+
+A two-key dict costs about 180 bytes per message before the text; Message
+uses __slots__ (no per-instance __dict__) and interns its role, so every
+message with the same role shares one string. The timestamp and the token
+estimate are optional; the token count is filled in the first time the
+history window needs it and reused afterwards.
+"""
+import sys
+import time
+
+USER = sys.intern("user")
+ASSISTANT = sys.intern("assistant")
+
+
+class Message:
+    __slots__ = ('role', 'content', 'timestamp', 'tokens')
+
+    def __init__(self, role, content, timestamp=None, tokens=None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.timestamp = timestamp
+        self.tokens = tokens
+
+    @classmethod
+    def user(cls, content, timestamp=None):
+        return cls(USER, content, timestamp)
+
+    @classmethod
+    def assistant(cls, content, timestamp=None):
+        return cls(ASSISTANT, content, timestamp)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["role"], data["content"], data.get("timestamp"))
+
+    def to_dict(self):
+        """The {"role", "content"} shape served by /history."""
+        return {"role": self.role, "content": self.content}
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content[:40]!r})"
+
+
+def turn(user_input, reply):
+    """The user/assistant message pair stored for one exchange, sharing one timestamp."""
+    now = time.time()
+    return Message(USER, user_input, now), Message(ASSISTANT, reply, now)
@@ -0,0 +1,138 @@
+"""Routes each question to a Gemini model and generation config.
+
+Routes are matched in order against the question's complexity and
+question_type (from analyze_user_input) and its top-level curriculum domain
+(from query_filter.match_domain); the first route whose conditions all hold
+wins, and a route without conditions matches everything. Set
+MODEL_ROUTES_FILE to a JSON list to replace the built-in table:
+
+    [
+      {"name": "quick", "model": "gemini-2.0-flash-lite",
+       "when": {"complexity": ["low"], "question_type": ["definition"]},
+       "generation_settings": {"max_output_tokens": 384}},
+      {"name": "default", "model": "gemini-2.0-flash"}
+    ]
+
+A route's generation_settings are merged over the app's defaults.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+ROUTE_CONDITIONS = ("complexity", "question_type", "domain")
+
+Route = namedtuple('Route', ['name', 'model', 'generation_settings', 'when'])
+
+DEFAULT_ROUTES = [
+    # Short "what is X" questions: a lighter, faster model and a small answer
+    {"name": "quick", "model": "gemini-2.0-flash-lite",
+     "when": {"complexity": ["low"], "question_type": ["definition"]},
+     "generation_settings": {"temperature": 0.5, "max_output_tokens": 384}},
+    # Long multi-step questions get room for worked solutions
+    {"name": "deep", "model": "gemini-2.0-flash",
+     "when": {"complexity": ["high"], "question_type": ["procedural", "conceptual", "comparison"]},
+     "generation_settings": {"max_output_tokens": 2048}},
+    {"name": "default", "model": "gemini-2.0-flash"},
+]
+
+
+def usage_tokens(usage_metadata):
+    """(prompt tokens, output tokens) from a Gemini usage_metadata, 0 where unknown."""
+    if usage_metadata is None:
+        return 0, 0
+    return (getattr(usage_metadata, 'prompt_token_count', None) or 0,
+            getattr(usage_metadata, 'candidates_token_count', None) or 0)
+
+
+class ModelRouter:
+    """Ordered routing table plus per-route latency and token counters."""
+
+    def __init__(self, routes, base_settings):
+        self.routes = []
+        for spec in routes:
+            when = {condition: frozenset(values) for condition, values in spec.get("when", {}).items()}
+            unknown = set(when) - set(ROUTE_CONDITIONS)
+            if unknown:
+                raise ValueError(f"Route '{spec['name']}' has unknown conditions: {sorted(unknown)}")
+            settings = dict(base_settings, **spec.get("generation_settings", {}))
+            self.routes.append(Route(spec["name"], spec["model"], settings, when))
+        if not self.routes or self.routes[-1].when:
+            raise ValueError("The last route must have no conditions so that every question is routed")
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @classmethod
+    def from_env(cls, base_settings):
+        path = os.getenv('MODEL_ROUTES_FILE')
+        if path:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    router = cls(json.load(f), base_settings)
+                logger.info(f"Loaded {len(router.routes)} model routes from {path}")
+                return router
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Could not load model routes from {path}: {e}")
+        return cls(DEFAULT_ROUTES, base_settings)
+
+    def route(self, complexity, question_type, domain=None):
+        """Return the first Route matching the question; domain is a top-level subject or None."""
+        values = {"complexity": complexity, "question_type": question_type, "domain": domain}
+        for route in self.routes:
+            if all(values[condition] in allowed for condition, allowed in route.when.items()):
+                return route
+        return self.routes[-1]
+
+    def record(self, route_name, milliseconds, usage_metadata=None):
+        prompt_tokens, output_tokens = usage_tokens(usage_metadata)
+        with self._lock:
+            stats = self._stats.setdefault(route_name, {
+                "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "prompt_tokens": 0, "output_tokens": 0
+            })
+            stats["calls"] += 1
+            stats["total_ms"] += milliseconds
+            stats["max_ms"] = max(stats["max_ms"], milliseconds)
+            stats["prompt_tokens"] += prompt_tokens
+            stats["output_tokens"] += output_tokens
+
+    def track(self, route_name, chunks):
+        """Pass a response stream through, recording its latency and usage once it ends."""
+        started = time.perf_counter()
+
+        def tracked():
+            usage = None
+            for chunk in chunks:
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                yield chunk
+            self.record(route_name, (time.perf_counter() - started) * 1000, usage)
+        return tracked()
+
+    def track_async(self, route_name, chunks):
+        """Async version of track for the aio client's streams."""
+        started = time.perf_counter()
+
+        async def tracked():
+            usage = None
+            async for chunk in chunks:
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                yield chunk
+            self.record(route_name, (time.perf_counter() - started) * 1000, usage)
+        return tracked()
+
+    def stats(self):
+        with self._lock:
+            routes = {}
+            for name, stats in self._stats.items():
+                routes[name] = dict(
+                    stats,
+                    avg_ms=stats["total_ms"] / stats["calls"],
+                    avg_output_tokens=stats["output_tokens"] / stats["calls"],
+                )
+        return {
+            "table": [{"name": route.name, "model": route.model} for route in self.routes],
+            "routes": routes
+        }
@@ -0,0 +1,189 @@
+"""Offline, lazy access to the NLTK data EduBot needs.
+
+Nothing here touches the network at import or request time. Data is looked
+up in NLTK_DATA_DIR (default: ./nltk_data next to this file) and then in
+NLTK's usual search path. Populate the directory at build time with:
+
+    python nltk_resources.py prefetch
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import threading
+
+import nltk
+
+logger = logging.getLogger(__name__)
+
+NLTK_DATA_DIR = os.getenv(
+    'NLTK_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
+)
+
+# Bundled/vendored data wins over anything installed system-wide
+if NLTK_DATA_DIR not in nltk.data.path:
+    nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+# Downloader package name -> path passed to nltk.data.find()
+REQUIRED_RESOURCES = {
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet',
+}
+
+# NLTK 3.9 replaced the pickled punkt and tagger models with punkt_tab and JSON
+_NLTK_VERSION = tuple(int(part) for part in re.findall(r'\d+', nltk.__version__)[:2])
+if _NLTK_VERSION >= (3, 9):
+    REQUIRED_RESOURCES['punkt_tab'] = 'tokenizers/punkt_tab/english'
+    REQUIRED_RESOURCES['averaged_perceptron_tagger_eng'] = 'taggers/averaged_perceptron_tagger_eng'
+else:
+    REQUIRED_RESOURCES['punkt'] = 'tokenizers/punkt'
+    REQUIRED_RESOURCES['averaged_perceptron_tagger'] = 'taggers/averaged_perceptron_tagger'
+
+_lock = threading.Lock()
+_availability = {}
+_loaded = {}
+
+
+def is_available(name):
+    """Return True if the named resource can be found on disk (result is memoized)."""
+    if name not in _availability:
+        try:
+            nltk.data.find(REQUIRED_RESOURCES[name])
+            _availability[name] = True
+        except LookupError:
+            _availability[name] = False
+    return _availability[name]
+
+
+def missing_resources():
+    """List the required resources that are not present on disk."""
+    return [name for name in REQUIRED_RESOURCES if not is_available(name)]
+
+
+def _load_once(key, loader):
+    """Run loader the first time key is requested and reuse its result afterwards."""
+    if key in _loaded:
+        return _loaded[key]
+    with _lock:
+        if key not in _loaded:
+            try:
+                _loaded[key] = loader()
+            except LookupError as e:
+                logger.warning(f"NLTK resource '{key}' is not available: {e}")
+                _loaded[key] = None
+    return _loaded[key]
+
+
+def get_stop_words():
+    """English stop words, or an empty set if the corpus is missing."""
+    def load():
+        from nltk.corpus import stopwords
+        return frozenset(stopwords.words('english'))
+    return _load_once('stopwords', load) or frozenset()
+
+
+def get_lemmatizer():
+    """Shared WordNetLemmatizer, or None if WordNet is missing."""
+    def load():
+        from nltk.stem import WordNetLemmatizer
+        lemmatizer = WordNetLemmatizer()
+        # WordNet is a lazy corpus; touch it now so a missing corpus fails here
+        lemmatizer.lemmatize('test')
+        return lemmatizer
+    return _load_once('wordnet', load)
+
+
+def get_tagger():
+    """Process-wide PerceptronTagger, or None if its model is missing.
+
+    nltk.pos_tag() may build a new tagger (and reload its weights) on every
+    call depending on the NLTK version; this one is built once and reused.
+    """
+    def load():
+        from nltk.tag.perceptron import PerceptronTagger
+        return PerceptronTagger()
+    return _load_once('tagger', load)
+
+
+def warm_up():
+    """Load every resource used per request so the first request doesn't pay for it."""
+    get_stop_words()
+    get_lemmatizer()
+    tagger = get_tagger()
+    try:
+        from nltk.tokenize import word_tokenize
+        tokens = word_tokenize("Warm up the tokenizer. Then the tagger.")
+        if tagger:
+            tagger.tag(tokens)
+    except LookupError as e:
+        logger.warning(f"NLTK tokenizer data is not available: {e}")
+    missing = missing_resources()
+    if missing:
+        logger.warning(f"Missing NLTK resources: {', '.join(missing)}. Run 'python nltk_resources.py prefetch'.")
+
+
+def reset():
+    """Forget cached availability and loaded resources (e.g. after a prefetch)."""
+    with _lock:
+        _availability.clear()
+        _loaded.clear()
+
+
+def prefetch(resources=None, data_dir=NLTK_DATA_DIR):
+    """Download resources into data_dir. Meant for build time, not for serving.
+
+    Returns the list of resources that failed to download.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    failed = []
+    for name in resources or REQUIRED_RESOURCES:
+        logger.info(f"Fetching NLTK resource '{name}' into {data_dir}")
+        try:
+            ok = nltk.download(name, download_dir=data_dir, quiet=True, raise_on_error=True)
+        except Exception as e:
+            logger.error(f"Download of '{name}' failed: {e}")
+            ok = False
+        if not ok:
+            failed.append(name)
+    reset()
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the NLTK data used by EduBot.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    prefetch_parser = subparsers.add_parser('prefetch', help="download NLTK data for offline use")
+    prefetch_parser.add_argument('resources', nargs='*', help="resources to fetch (default: all required)")
+    prefetch_parser.add_argument('--data-dir', default=NLTK_DATA_DIR, help="target directory")
+
+    subparsers.add_parser('check', help="report which required resources are missing")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'prefetch':
+        unknown = [name for name in args.resources if name not in REQUIRED_RESOURCES]
+        if unknown:
+            parser.error(f"unknown resources: {', '.join(unknown)}")
+        if args.data_dir not in nltk.data.path:
+            nltk.data.path.insert(0, args.data_dir)
+        failed = prefetch(args.resources, args.data_dir)
+        if failed:
+            print(f"Failed to fetch: {', '.join(failed)}")
+            return 1
+        print(f"NLTK data ready in {args.data_dir}")
+        return 0
+
+    missing = missing_resources()
+    if missing:
+        print(f"Missing NLTK resources: {', '.join(missing)}")
+        return 1
+    print("All required NLTK resources are available")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Reuse of the static system instruction across Gemini calls.
+
+PROMPT_CACHE_BACKEND picks how the instruction is attached to a request:
+
+    none    send it as system_instruction on every call (the default)
+    gemini  store it once per model with the API's context caching and send
+            the cached_content name instead; falls back to "none" while the
+            cache can't be created, and without calling the API at all while
+            the instruction is below PROMPT_CACHE_MIN_TOKENS (the API minimum)
+    local   offline stand-in for "gemini": keeps the same per-model entries,
+            TTLs and counters in memory but leaves requests unchanged, so
+            the caching logic can be exercised without an API key
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from history_window import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Refresh a cache entry this long before it expires on the server
+REFRESH_MARGIN_SECONDS = 60
+# After a failed create, wait this long before trying again
+RETRY_AFTER_SECONDS = 600
+# Smallest prompt the Gemini API accepts for context caching
+MIN_CACHE_TOKENS = 1024
+
+
+class PromptCache:
+    """The "none" backend, and the bookkeeping shared by the caching backends."""
+
+    backend = "none"
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # (model, instruction hash) -> (cached content name or None, expires_at)
+        self._creating = set()  # keys whose entry is being created right now
+        self.hits = 0
+        self.misses = 0
+        self.creations = 0
+        self.failures = 0
+        self.cached_tokens = 0
+
+    def _create(self, model, system_instruction):
+        """Store system_instruction for model; return the name requests should reference."""
+        return None
+
+    def _request_fields(self, name, system_instruction):
+        return {"system_instruction": system_instruction}
+
+    def config_fields(self, model, system_instruction):
+        """GenerateContentConfig fields that attach system_instruction to a request for model."""
+        if self.backend == "none":
+            return self._request_fields(None, system_instruction)
+
+        key = (model, hashlib.sha256(system_instruction.encode('utf-8')).hexdigest())
+        with self._lock:
+            name, expires_at = self._entries.get(key, (None, 0.0))
+            if expires_at > time.monotonic() or key in self._creating:
+                # While another request refreshes the entry, the old name stays
+                # valid on the server for REFRESH_MARGIN_SECONDS
+                if name:
+                    self.hits += 1
+                    self.cached_tokens += estimate_tokens(system_instruction)
+                return self._request_fields(name, system_instruction)
+            self._creating.add(key)
+            self.misses += 1
+
+        # Create (or refresh) the entry outside the lock: it's a network call
+        try:
+            name = self._create(model, system_instruction)
+            entry = (name, time.monotonic() + self.ttl - REFRESH_MARGIN_SECONDS)
+        except Exception as e:
+            logger.warning(f"Could not cache the system instruction for {model}: {e}")
+            name = None
+            entry = (None, time.monotonic() + RETRY_AFTER_SECONDS)
+        with self._lock:
+            self._entries[key] = entry
+            self._creating.discard(key)
+            if name:
+                self.creations += 1
+            else:
+                self.failures += 1
+        return self._request_fields(name, system_instruction)
+
+    def stats(self):
+        with self._lock:
+            entries = sum(1 for name, _ in self._entries.values() if name)
+        return {
+            "backend": self.backend,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "creations": self.creations,
+            "failures": self.failures,
+            "cached_tokens": self.cached_tokens
+        }
+
+
+class LocalPromptCache(PromptCache):
+    """Offline stand-in: tracks cache entries without touching requests."""
+
+    backend = "local"
+
+    def _create(self, model, system_instruction):
+        digest = hashlib.sha256(f"{model}\0{system_instruction}".encode('utf-8')).hexdigest()
+        return f"local/cachedContents/{digest[:16]}"
+
+
+class GeminiPromptCache(PromptCache):
+    """Gemini context caching of the system instruction, one cached content per model."""
+
+    backend = "gemini"
+
+    def __init__(self, client, ttl=3600, min_tokens=MIN_CACHE_TOKENS):
+        super().__init__(ttl)
+        self.client = client
+        self.min_tokens = min_tokens
+
+    def _create(self, model, system_instruction):
+        from google.genai import types
+
+        if self.client is None:
+            raise RuntimeError("Gemini client is not configured")
+        tokens = estimate_tokens(system_instruction)
+        if tokens < self.min_tokens:
+            raise ValueError(f"the instruction has about {tokens} tokens, "
+                             f"below the {self.min_tokens}-token minimum for context caching")
+        cached = self.client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                display_name="edubot-system-instruction",
+                system_instruction=system_instruction,
+                ttl=f"{self.ttl}s",
+            ),
+        )
+        logger.info(f"Cached the system instruction for {model} as {cached.name}")
+        return cached.name
+
+    def _request_fields(self, name, system_instruction):
+        # A request that uses cached content must not repeat its system instruction
+        if name:
+            return {"cached_content": name}
+        return {"system_instruction": system_instruction}
+
+
+def prompt_cache_from_env(client):
+    backend = os.getenv('PROMPT_CACHE_BACKEND', 'none').lower()
+    ttl = int(os.getenv('PROMPT_CACHE_TTL', '3600'))
+    if backend == 'gemini':
+        return GeminiPromptCache(client, ttl, int(os.getenv('PROMPT_CACHE_MIN_TOKENS', str(MIN_CACHE_TOKENS))))
+    if backend == 'local':
+        return LocalPromptCache(ttl)
+    if backend != 'none':
+        logger.warning(f"Unknown PROMPT_CACHE_BACKEND '{backend}', not caching the system instruction")
+    return PromptCache(ttl)
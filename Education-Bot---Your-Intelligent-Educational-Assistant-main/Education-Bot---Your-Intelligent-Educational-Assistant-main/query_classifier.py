@@ -0,0 +1,235 @@
+"""Small local classifier that gates educational vs. off-topic queries.
+
+Hashed word unigram/bigram and character trigram features feed a logistic
+regression trained with NumPy. Train it from a JSONL file whose lines look
+like {"text": "...", "label": "educational"} (labels may also be
+"off_topic", true/false or 1/0):
+
+    python query_classifier.py train labeled.jsonl -o query_classifier.npz --holdout 0.2
+    python query_classifier.py evaluate labeled.jsonl --model query_classifier.npz
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import sys
+import time
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 2 ** 18
+DEFAULT_THRESHOLD = 0.8
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_POSITIVE_LABELS = {True, 1, "1", "true", "educational", "edu", "yes"}
+
+
+def _feature_names(text):
+    words = _WORD_RE.findall(text.lower())
+    features = [f"w:{word}" for word in words]
+    features += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return features
+
+
+def feature_indices(text, n_features=N_FEATURES):
+    """Distinct hashed feature indices of text."""
+    return np.unique(np.fromiter(
+        (zlib.crc32(name.encode('utf-8')) % n_features for name in _feature_names(text)),
+        dtype=np.int64
+    ))
+
+
+def parse_label(label):
+    if isinstance(label, str):
+        label = label.strip().lower()
+    return label in _POSITIVE_LABELS
+
+
+class QueryClassifier:
+    """Logistic regression over hashed n-gram features."""
+
+    def __init__(self, weights, bias=0.0, threshold=DEFAULT_THRESHOLD):
+        self.weights = weights
+        self.bias = float(bias)
+        self.threshold = threshold
+
+    @property
+    def n_features(self):
+        return len(self.weights)
+
+    def predict_proba(self, text):
+        """Probability that text is an educational query."""
+        score = self.weights[feature_indices(text, self.n_features)].sum() + self.bias
+        return 1.0 / (1.0 + np.exp(-score))
+
+    def classify(self, text):
+        """Return (decision, probability); decision is None when the model isn't confident."""
+        probability = float(self.predict_proba(text))
+        if probability >= self.threshold:
+            return True, probability
+        if probability <= 1.0 - self.threshold:
+            return False, probability
+        return None, probability
+
+    @classmethod
+    def train(cls, texts, labels, epochs=20, learning_rate=0.5, l2=1e-5,
+              n_features=N_FEATURES, threshold=DEFAULT_THRESHOLD, seed=0):
+        """Fit the model with plain SGD on the logistic loss."""
+        weights = np.zeros(n_features, dtype=np.float64)
+        bias = 0.0
+        examples = [(feature_indices(text, n_features), 1.0 if label else 0.0) for text, label in zip(texts, labels)]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(examples)
+            rate = learning_rate / (1 + epoch * 0.1)
+            for indices, target in examples:
+                probability = 1.0 / (1.0 + np.exp(-(weights[indices].sum() + bias)))
+                gradient = probability - target
+                weights[indices] -= rate * (gradient + l2 * weights[indices])
+                bias -= rate * gradient
+        return cls(weights, bias, threshold)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, weights=self.weights.astype(np.float32),
+                                bias=np.float64(self.bias), threshold=np.float64(self.threshold))
+
+    @classmethod
+    def load(cls, path, threshold=None):
+        with np.load(path) as data:
+            weights = data['weights'].astype(np.float64)
+            stored_threshold = float(data['threshold'])
+            bias = float(data['bias'])
+        return cls(weights, bias, threshold if threshold is not None else stored_threshold)
+
+
+def load_classifier(path, threshold=None):
+    """Load a trained model, or return None (with a log message) if there is none."""
+    try:
+        classifier = QueryClassifier.load(path, threshold)
+    except FileNotFoundError:
+        logger.info(f"No query classifier at {path}; using the rule-based filter only")
+        return None
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"Could not load query classifier from {path}: {e}")
+        return None
+    logger.info(f"Loaded query classifier from {path} (threshold {classifier.threshold})")
+    return classifier
+
+
+def read_labeled_jsonl(path, text_field='text', label_field='label'):
+    texts, labels = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                texts.append(record[text_field])
+                labels.append(parse_label(record[label_field]))
+    return texts, labels
+
+
+def evaluation_report(classifier, texts, labels, fallback=None):
+    """Accuracy figures for the model alone and for the model gated by its threshold.
+
+    fallback(text) -> bool decides the queries the model is not confident about.
+    """
+    correct = confident = confident_correct = gated_correct = 0
+    true_positive = predicted_positive = actual_positive = 0
+    for text, label in zip(texts, labels):
+        decision, probability = classifier.classify(text)
+        predicted = probability >= 0.5
+        correct += predicted == label
+        true_positive += predicted and label
+        predicted_positive += predicted
+        actual_positive += label
+        if decision is not None:
+            confident += 1
+            confident_correct += decision == label
+        elif fallback:
+            decision = fallback(text)
+        gated_correct += decision == label
+    total = len(texts) or 1
+    report = {
+        "examples": len(texts),
+        "accuracy": correct / total,
+        "precision": true_positive / predicted_positive if predicted_positive else 0.0,
+        "recall": true_positive / actual_positive if actual_positive else 0.0,
+        "coverage": confident / total,
+        "confident_accuracy": confident_correct / confident if confident else 0.0,
+        "gated_accuracy": gated_correct / total,
+    }
+    if fallback:
+        report["fallback_only_accuracy"] = sum(fallback(text) == label for text, label in zip(texts, labels)) / total
+    return report
+
+
+def _print_report(report):
+    for key, value in report.items():
+        print(f"  {key:<24} {value:.3f}" if isinstance(value, float) else f"  {key:<24} {value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or evaluate the EduBot query classifier.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help="train a model from labeled JSONL")
+    train_parser.add_argument('data', help="JSONL file with text and label fields")
+    train_parser.add_argument('-o', '--output', default='query_classifier.npz', help="where to save the model")
+    train_parser.add_argument('--epochs', type=int, default=20)
+    train_parser.add_argument('--learning-rate', type=float, default=0.5)
+    train_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                              help="confidence needed to override the rule-based filter")
+    train_parser.add_argument('--holdout', type=float, default=0.2, help="fraction held out for the accuracy report")
+
+    evaluate_parser = subparsers.add_parser('evaluate', help="report accuracy of a trained model")
+    evaluate_parser.add_argument('data', help="JSONL file with text and label fields")
+    evaluate_parser.add_argument('--model', default='query_classifier.npz')
+    evaluate_parser.add_argument('--threshold', type=float, help="override the stored threshold")
+
+    for subparser in (train_parser, evaluate_parser):
+        subparser.add_argument('--text-field', default='text')
+        subparser.add_argument('--label-field', default='label')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from query_filter import rule_based_match
+
+    def fallback(text):
+        return rule_based_match(text) is not None
+
+    texts, labels = read_labeled_jsonl(args.data, args.text_field, args.label_field)
+
+    if args.command == 'train':
+        examples = list(zip(texts, labels))
+        random.Random(0).shuffle(examples)
+        split = len(examples) - int(len(examples) * args.holdout)
+        train_set, holdout_set = examples[:split], examples[split:]
+
+        start = time.perf_counter()
+        classifier = QueryClassifier.train([text for text, _ in train_set], [label for _, label in train_set],
+                                           epochs=args.epochs, learning_rate=args.learning_rate,
+                                           threshold=args.threshold)
+        print(f"Trained on {len(train_set)} examples in {time.perf_counter() - start:.1f}s")
+        classifier.save(args.output)
+        print(f"Saved model to {args.output}")
+        if holdout_set:
+            print(f"Holdout report ({len(holdout_set)} examples):")
+            _print_report(evaluation_report(classifier, [text for text, _ in holdout_set],
+                                            [label for _, label in holdout_set], fallback))
+        return 0
+
+    classifier = QueryClassifier.load(args.model, args.threshold)
+    _print_report(evaluation_report(classifier, texts, labels, fallback))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
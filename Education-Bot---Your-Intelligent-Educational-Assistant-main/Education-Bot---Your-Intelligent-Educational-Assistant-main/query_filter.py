@@ -0,0 +1,120 @@
+"""Decide whether a message is educational (or about the chat itself).
+
+All rules are compiled once at import: one alternation regex per rule group
+with a named group per rule, so a query is scanned once per group instead of
+once per pattern, and the name of the matching rule is available for logging.
+Subject keywords come from the curriculum taxonomy (see taxonomy.py).
+
+If a trained local classifier is available (see query_classifier.py), it
+decides whenever it is confident and the rules handle the rest.
+"""
+import os
+import re
+
+from query_classifier import load_classifier
+from taxonomy import load_taxonomy
+
+# Education-focused topics, used when no curriculum taxonomy file is available
+EDUCATIONAL_DOMAINS = [
+    "mathematics", "algebra", "geometry", "calculus", "statistics", "probability",
+    "physics", "chemistry", "biology", "anatomy", "astronomy", "earth science",
+    "history", "geography", "civics", "economics", "political science",
+    "literature", "grammar", "writing", "poetry", "language arts",
+    "computer science", "programming", "data science", "artificial intelligence",
+    "art history", "music theory", "philosophy", "psychology", "sociology",
+    "foreign languages", "education", "study skills", "research methods"
+]
+
+# Chat history and self-reference queries
+CHAT_PATTERNS = [
+    ("previous_message", r"(previous|last|earlier) (message|prompt|question)"),
+    ("what_did_i_say", r"what (did|was) (i|you) (say|ask|told|tell)"),
+    ("show_history", r"(show|display|get|fetch) (my|the) (history|conversation)"),
+    ("what_is_my", r"what (is|was) my"),
+    ("remember", r"can you (remember|recall)"),
+    ("who_am_i", r"who (am i|are you)"),
+]
+
+# Educational question patterns
+EDUCATIONAL_PATTERNS = [
+    ("what_is", r"what (is|are|was|were) .+\?"),
+    ("how_does", r"how (do|does|can|could) .+\?"),
+    ("why_is", r"why (is|are|does|do) .+\?"),
+    ("explain", r"explain .+"),
+    ("define", r"define .+"),
+    ("describe", r"describe .+"),
+    ("teach_me", r"teach me .+"),
+    ("learn_about", r"learn about .+"),
+    ("understand", r"understand .+"),
+    ("help_with", r"(help|assist) .+ (with|in) .+"),
+]
+
+
+def _compile_rules(rules):
+    return re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in rules))
+
+
+_CHAT_RE = _compile_rules(CHAT_PATTERNS)
+_EDUCATIONAL_RE = _compile_rules(EDUCATIONAL_PATTERNS)
+TAXONOMY = load_taxonomy(EDUCATIONAL_DOMAINS)
+
+
+def match_domain(query):
+    """Return the most specific curriculum path mentioned in query (e.g.
+    "math/calculus/integration"), or None."""
+    match = TAXONOMY.best_match(query)
+    return match.path if match else None
+
+
+QUERY_CLASSIFIER_MODEL = os.getenv(
+    'QUERY_CLASSIFIER_MODEL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_classifier.npz')
+)
+_threshold = os.getenv('QUERY_CLASSIFIER_THRESHOLD')
+CLASSIFIER = load_classifier(QUERY_CLASSIFIER_MODEL, float(_threshold) if _threshold else None)
+
+
+def _match_chat(query_lower):
+    match = _CHAT_RE.search(query_lower)
+    return f"chat:{match.lastgroup}" if match else None
+
+
+def _match_subject(query_lower):
+    domain = match_domain(query_lower)
+    if domain:
+        return f"domain:{domain}"
+
+    match = _EDUCATIONAL_RE.search(query_lower)
+    if match:
+        return f"pattern:{match.lastgroup}"
+
+    return None
+
+
+def rule_based_match(query):
+    """Like match_query, but using the regex and taxonomy rules only."""
+    query_lower = query.lower()
+    return _match_chat(query_lower) or _match_subject(query_lower)
+
+
+def match_query(query):
+    """Return the name of the rule accepting query (e.g. "chat:who_am_i",
+    "model:0.97", "domain:math/calculus", "pattern:explain"), or None if the
+    query is off-topic."""
+    query_lower = query.lower()
+
+    rule = _match_chat(query_lower)
+    if rule:
+        return rule
+
+    if CLASSIFIER:
+        decision, probability = CLASSIFIER.classify(query)
+        if decision is not None:
+            return f"model:{probability:.2f}" if decision else None
+
+    return _match_subject(query_lower)
+
+
+def is_educational_query(query):
+    """Check if the query is related to education or chat functionality."""
+    return match_query(query) is not None
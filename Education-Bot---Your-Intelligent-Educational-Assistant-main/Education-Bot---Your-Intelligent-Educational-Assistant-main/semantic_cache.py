@@ -0,0 +1,196 @@
+"""Near-duplicate answer cache over the lemmas from analyze_user_input.
+
+Paraphrases such as "what is photosynthesis" and "explain photosynthesis to
+me" reduce to the same content lemmas once stop words and instruction words
+are dropped. A question is represented by its lemmas plus the ordered pairs
+of neighbouring lemmas, so word order counts: "convert Fahrenheit to
+Celsius" shares its lemmas with the reverse conversion but none of its
+pairs. These sets are indexed with MinHash signatures and LSH banding;
+candidates from matching bands are confirmed with the exact Jaccard
+similarity, so only entries at or above the threshold are ever served.
+Questions whose meaning lies partly outside the lemmas (symbols such as
+"x^2", negations) are not shared at all; see text_analysis.literal_tokens().
+Everything runs in-process, with no external service or model.
+
+Entries hold a key into the response cache rather than the answer itself,
+so answers stay bounded by RESPONSE_CACHE_MAX_BYTES; once the response
+cache evicts an answer, paraphrases of it simply miss.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Lemmas that ask for an answer without saying what the answer is about
+INSTRUCTION_LEMMAS = frozenset({
+    "explain", "tell", "describe", "define", "teach", "help", "give", "show",
+    "please", "understand", "learn", "know", "want", "need", "mean",
+})
+
+_PRIME = (1 << 61) - 1
+
+
+def _hash(item):
+    return int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def choose_bands(num_perm, threshold):
+    """Split num_perm hash values into (bands, rows) for an LSH threshold.
+
+    Picks the banding whose S-curve midpoint (1/bands) ** (1/rows) is the
+    highest one not above threshold, favouring recall; precision comes from
+    the exact Jaccard check afterwards.
+    """
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) <= threshold]
+    return max(below, key=lambda option: (1 / option[0]) ** (1 / option[1])) if below else options[0]
+
+
+def signature_sequence(lemmas):
+    """The lemmas that identify a question, in order, without instruction words."""
+    return tuple(lemma for lemma in lemmas if lemma not in INSTRUCTION_LEMMAS)
+
+
+def signature_items(lemmas):
+    """The lemma set that identifies a question, without instruction words."""
+    return frozenset(signature_sequence(lemmas))
+
+
+def signature_shingles(lemmas):
+    """signature_items plus "a b" for every lemma a directly followed by b."""
+    sequence = signature_sequence(lemmas)
+    return frozenset(sequence).union(f"{a} {b}" for a, b in zip(sequence, sequence[1:]))
+
+
+class SemanticCache:
+    """LRU/TTL map from questions to response cache keys, looked up by lemma similarity."""
+
+    def __init__(self, threshold=0.8, num_perm=32, max_entries=100000, ttl=86400, seed=1):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        rng = random.Random(seed)
+        self._permutations = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self._entries = OrderedDict()  # id -> (items, partition, key, expires_at)
+        self._buckets = {}  # band key -> entry id, or a list of ids on collision
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.candidates_checked = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.8')),
+            max_entries=int(os.getenv('SEMANTIC_CACHE_ENTRIES', '100000')),
+            ttl=int(os.getenv('SEMANTIC_CACHE_TTL', '86400')),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, items, partition):
+        hashes = [_hash(item) for item in items]
+        signature = [min((a * h + b) % _PRIME for h in hashes) for a, b in self._permutations]
+        rows = self.rows
+        return [hash((partition, band, tuple(signature[band * rows:(band + 1) * rows])))
+                for band in range(self.bands)]
+
+    def _add_to_bucket(self, key, entry_id):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = entry_id
+        elif isinstance(bucket, list):
+            bucket.append(entry_id)
+        else:
+            self._buckets[key] = [bucket, entry_id]
+
+    def _remove_from_bucket(self, key, entry_id):
+        bucket = self._buckets.get(key)
+        if isinstance(bucket, list):
+            if entry_id in bucket:
+                bucket.remove(entry_id)
+            if len(bucket) == 1:
+                self._buckets[key] = bucket[0]
+        elif bucket == entry_id:
+            del self._buckets[key]
+
+    def _evict(self, entry_id):
+        items, partition, _, _ = self._entries.pop(entry_id)
+        for key in self._band_keys(items, partition):
+            self._remove_from_bucket(key, entry_id)
+
+    def get(self, lemmas, partition):
+        """Return the response cache key stored for a paraphrase of lemmas within partition, or None."""
+        items = signature_shingles(lemmas)
+        if not items or not self.enabled:
+            return None
+        keys = self._band_keys(items, partition)
+        now = time.monotonic()
+        with self._lock:
+            candidates = set()
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if isinstance(bucket, list):
+                    candidates.update(bucket)
+                elif bucket is not None:
+                    candidates.add(bucket)
+
+            best_id, best_similarity = None, 0.0
+            for entry_id in candidates:
+                entry_items, entry_partition, _, expires_at = self._entries[entry_id]
+                if entry_partition != partition:
+                    continue
+                if expires_at <= now:
+                    self._evict(entry_id)
+                    continue
+                self.candidates_checked += 1
+                similarity = len(items & entry_items) / len(items | entry_items)
+                if similarity >= self.threshold and similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2]
+
+    def put(self, lemmas, partition, key):
+        items = signature_shingles(lemmas)
+        if not items or not key or not self.enabled:
+            return
+        band_keys = self._band_keys(items, partition)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (items, partition, key, time.monotonic() + self.ttl)
+            for band_key in band_keys:
+                self._add_to_bucket(band_key, entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "bands": self.bands,
+            "rows": self.rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "candidates_per_lookup": self.candidates_checked / lookups if lookups else 0.0
+        }
@@ -0,0 +1,680 @@
+"""Conversation history storage.
+
+SESSION_STORE selects the backend:
+
+    memory  InMemorySessionStore: a process-local dict with three limits, a
+            maximum number of sessions (least recently used ones are evicted
+            first), an idle TTL and a budget on the estimated bytes held by
+            all histories
+    sqlite  SQLiteSessionStore: a SQLite file in WAL mode (SESSION_DB) shared
+            by every worker process on the machine; history survives restarts
+    redis   RedisSessionStore: a Redis server (REDIS_URL) shared by every
+            node; needs the optional redis package, or REDIS_URL=memory://
+            for the in-process FakeRedis
+
+Both expire idle sessions from a background reaper thread. Listeners
+registered with add_eviction_listener hear about every evicted session, so
+per-session state kept elsewhere can be dropped with it.
+"""
+import heapq
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from history_ring import HistoryRing
+from message import Message
+
+try:
+    import redis
+except ImportError:  # only needed for SESSION_STORE=redis with a real server
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGES = 20
+
+
+def message_bytes(message):
+    """Approximate memory held by one Message."""
+    return sys.getsizeof(message) + sys.getsizeof(message.content)
+
+
+class _Session:
+    __slots__ = ('messages', 'bytes', 'last_access')
+
+    def __init__(self, now, max_messages):
+        self.messages = HistoryRing(max_messages)
+        self.bytes = sys.getsizeof(self) + self.messages.overhead_bytes()
+        self.last_access = now
+
+
+class SessionStore:
+    """Eviction listeners and the reaper thread shared by the backends."""
+
+    def __init__(self):
+        self._listeners = []
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def add_eviction_listener(self, listener):
+        """Call listener(session_id, reason) for every session this process evicts."""
+        self._listeners.append(listener)
+
+    def _notify(self, evicted):
+        for session_id, reason in evicted:
+            logger.debug(f"Evicted session {session_id} ({reason})")
+            for listener in self._listeners:
+                try:
+                    listener(session_id, reason)
+                except Exception as e:
+                    logger.warning(f"Session eviction listener failed: {e}")
+
+    def reap(self):
+        raise NotImplementedError
+
+    def start_reaper(self, interval=60):
+        """Run reap() every interval seconds on a daemon thread."""
+        if self._reaper is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.reap()
+                except Exception as e:
+                    logger.warning(f"Session reaper failed: {e}")
+
+        self._reaper = threading.Thread(target=run, name='session-reaper', daemon=True)
+        self._reaper.start()
+
+    def close(self):
+        self._stop.set()
+
+
+class InMemorySessionStore(SessionStore):
+    """Session id -> list of recent messages, with LRU, idle-TTL and memory limits."""
+
+    def __init__(self, max_sessions=10000, idle_ttl=3600, max_bytes=256 * 1024 * 1024, max_messages=MAX_MESSAGES):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        super().__init__()
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # least recently used first
+        self._bytes = 0
+        self.created = 0
+        self.evictions = {"lru": 0, "idle": 0, "memory": 0}
+        self.reaper_runs = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_sessions=int(os.getenv('SESSION_MAX_COUNT', '10000')),
+            idle_ttl=int(os.getenv('SESSION_IDLE_TTL', '3600')),
+            max_bytes=int(float(os.getenv('SESSION_MEMORY_BUDGET_MB', '256')) * 1024 * 1024),
+        )
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def _touch(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict_locked(self, session_id, reason, evicted):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.bytes
+        self.evictions[reason] += 1
+        evicted.append((session_id, reason))
+
+    def _create_locked(self, session_id, evicted):
+        if session_id in self._sessions:
+            self._bytes -= self._sessions.pop(session_id).bytes
+        session = self._sessions[session_id] = _Session(time.monotonic(), self.max_messages)
+        self._bytes += session.bytes
+        self.created += 1
+        while len(self._sessions) > self.max_sessions:
+            self._evict_locked(next(iter(self._sessions)), "lru", evicted)
+        return session
+
+    def create(self, session_id):
+        """Start an empty history for session_id (replacing any existing one)."""
+        evicted = []
+        with self._lock:
+            self._create_locked(session_id, evicted)
+        self._notify(evicted)
+
+    def get(self, session_id):
+        """A snapshot of the session's messages, oldest first, or None if there is no such session."""
+        with self._lock:
+            session = self._touch(session_id)
+            # Copied under the lock: the ring is appended to and trimmed by concurrent requests
+            return list(session.messages) if session is not None else None
+
+    def append(self, session_id, *messages):
+        """Append messages, keeping the last max_messages.
+
+        Returns the messages trimmed from the front, oldest first. A session
+        that was evicted in the meantime is recreated.
+        """
+        evicted = []
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                session = self._create_locked(session_id, evicted)
+            trimmed = session.messages.extend(messages)
+            added = sum(message_bytes(message) for message in messages)
+            if trimmed:
+                added -= sum(message_bytes(message) for message in trimmed)
+            session.bytes += added
+            self._bytes += added
+
+            # Over the memory budget: drop the least recently used other sessions
+            while self._bytes > self.max_bytes and len(self._sessions) > 1:
+                oldest = next(iter(self._sessions))
+                if oldest == session_id:
+                    break
+                self._evict_locked(oldest, "memory", evicted)
+        self._notify(evicted)
+        return trimmed
+
+    def clear(self, session_id):
+        """Empty a session's history, keeping the session."""
+        with self._lock:
+            session = self._touch(session_id)
+            if session is not None:
+                overhead = sys.getsizeof(session) + session.messages.overhead_bytes()
+                self._bytes -= session.bytes - overhead
+                session.messages.clear()
+                session.bytes = overhead
+
+    def reap(self):
+        """Evict sessions idle for longer than idle_ttl; returns how many were evicted."""
+        evicted = []
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            self.reaper_runs += 1
+            # Sessions are ordered by last access, so the idle ones are at the front
+            while self._sessions:
+                session_id, session = next(iter(self._sessions.items()))
+                if session.last_access > cutoff:
+                    break
+                self._evict_locked(session_id, "idle", evicted)
+        self._notify(evicted)
+        return len(evicted)
+
+    def memory_report(self, top=5):
+        """Estimated memory per session: the average and the largest sessions."""
+        with self._lock:
+            largest = heapq.nlargest(top, self._sessions.items(), key=lambda item: item[1].bytes)
+            count = len(self._sessions)
+            return {
+                "avg_bytes_per_session": self._bytes / count if count else 0.0,
+                "largest_sessions": [
+                    # Session ids are credentials of sorts; a prefix is enough to tell them apart
+                    {"session": session_id[:8], "messages": len(session.messages), "bytes": session.bytes}
+                    for session_id, session in largest
+                ]
+            }
+
+    def stats(self):
+        memory = self.memory_report()
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "bytes": self._bytes,
+                "memory": memory,
+                "max_bytes": self.max_bytes,
+                "idle_ttl": self.idle_ttl,
+                "created": self.created,
+                "evictions": dict(self.evictions),
+                "reaper_runs": self.reaper_runs
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session histories in a SQLite database shared by all workers on a node.
+
+    Writes from all threads of a process go through one writer thread, which
+    commits whatever has queued up in a single transaction (group commit),
+    so concurrent requests don't contend for SQLite's write lock one by one.
+    Callers still wait for their own write, so a read that follows an append
+    always sees it. Reads use a per-thread connection and never block on
+    writers thanks to WAL.
+
+    Other workers may evict a session this process holds state for, so the
+    reaper also notifies listeners about sessions used here that have gone
+    idle locally or disappeared from the table.
+    """
+
+    def __init__(self, path, max_sessions=100000, idle_ttl=86400, max_messages=MAX_MESSAGES, max_batch=64):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self.max_batch = max_batch
+        super().__init__()
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._local_sessions = {}  # session id -> last use in this process, for eviction listeners
+        self.batches = 0
+        self.writes = 0
+        self.errors = 0
+        self.evictions = {"lru": 0, "idle": 0}
+        self.reaper_runs = 0
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(session_id TEXT PRIMARY KEY, last_access REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS messages_by_session ON messages (session_id, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_by_access ON sessions (last_access)")
+
+        self._writer = threading.Thread(target=self._write_loop, name='session-writer', daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv('SESSION_DB', 'sessions.db'),
+            max_sessions=int(os.getenv('SESSION_MAX_COUNT', '100000')),
+            idle_ttl=int(os.getenv('SESSION_IDLE_TTL', '86400')),
+        )
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads; each one
+        # keeps its own cache of prepared statements for the SQL below
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # Writes: queued operations, committed in batches by the writer thread
+
+    def _write_loop(self):
+        conn = self._connection()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                results = [operation(conn, *args) for operation, args, _ in batch]
+                conn.execute("COMMIT")
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                logger.warning(f"Session store batch of {len(batch)} failed, retrying one by one: {e}")
+                self._write_one_by_one(conn, batch)
+            else:
+                for (_, _, future), result in zip(batch, results):
+                    future.set_result(result)
+            self.batches += 1
+            self.writes += len(batch)
+
+    def _write_one_by_one(self, conn, batch):
+        for operation, args, future in batch:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                result = operation(conn, *args)
+                conn.execute("COMMIT")
+                future.set_result(result)
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                future.set_exception(e)
+
+    def _write(self, operation, *args):
+        future = Future()
+        self._queue.put((operation, args, future))
+        return future.result()
+
+    @staticmethod
+    def _create_op(conn, session_id):
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        conn.execute("INSERT OR REPLACE INTO sessions (session_id, last_access) VALUES (?, ?)",
+                     (session_id, time.time()))
+
+    def _append_op(self, conn, session_id, messages):
+        conn.execute("INSERT OR REPLACE INTO sessions (session_id, last_access) VALUES (?, ?)",
+                     (session_id, time.time()))
+        conn.executemany("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                         [(session_id, message.role, message.content) for message in messages])
+        rows = conn.execute(
+            "SELECT id, role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT -1 OFFSET ?",
+            (session_id, self.max_messages)
+        ).fetchall()
+        if not rows:
+            return []
+        conn.execute("DELETE FROM messages WHERE session_id = ? AND id <= ?", (session_id, rows[0][0]))
+        return [Message(role, content) for _, role, content in reversed(rows)]
+
+    @staticmethod
+    def _clear_op(conn, session_id):
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id))
+
+    def _reap_op(self, conn, cutoff):
+        evicted = [(row[0], "idle") for row in conn.execute(
+            "SELECT session_id FROM sessions WHERE last_access <= ?", (cutoff,))]
+        excess = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - len(evicted) - self.max_sessions
+        if excess > 0:
+            evicted += [(row[0], "lru") for row in conn.execute(
+                "SELECT session_id FROM sessions WHERE last_access > ? ORDER BY last_access LIMIT ?",
+                (cutoff, excess))]
+        ids = [(session_id,) for session_id, _ in evicted]
+        conn.executemany("DELETE FROM messages WHERE session_id = ?", ids)
+        conn.executemany("DELETE FROM sessions WHERE session_id = ?", ids)
+        return evicted
+
+    def _seen(self, session_id):
+        with self._lock:
+            self._local_sessions[session_id] = time.monotonic()
+
+    def create(self, session_id):
+        """Start an empty history for session_id (replacing any existing one)."""
+        self._seen(session_id)
+        try:
+            self._write(self._create_op, session_id)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Session store create failed: {e}")
+
+    def append(self, session_id, *messages):
+        """Append messages, keeping the last max_messages; returns the trimmed ones, oldest first."""
+        self._seen(session_id)
+        try:
+            return self._write(self._append_op, session_id, messages)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Session store append failed: {e}")
+            return []
+
+    def clear(self, session_id):
+        try:
+            self._write(self._clear_op, session_id)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Session store clear failed: {e}")
+
+    def reap(self):
+        """Evict idle sessions, then the least recently used ones over max_sessions.
+
+        Returns how many sessions listeners were notified about: the ones
+        evicted here, plus local ones that went idle or another worker evicted.
+        """
+        self.reaper_runs += 1
+        try:
+            evicted = self._write(self._reap_op, time.time() - self.idle_ttl)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Session store reap failed: {e}")
+            evicted = []
+        for _, reason in evicted:
+            self.evictions[reason] += 1
+
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            for session_id, _ in evicted:
+                self._local_sessions.pop(session_id, None)
+            idle = [session_id for session_id, last_use in self._local_sessions.items() if last_use <= cutoff]
+            for session_id in idle:
+                del self._local_sessions[session_id]
+            local = dict(self._local_sessions)
+        evicted += [(session_id, "idle") for session_id in idle]
+
+        existing = self._existing(local) if local else set()
+        gone = [session_id for session_id in local if session_id not in existing]
+        with self._lock:
+            # Skip sessions used again since the snapshot; they are back in the table
+            gone = [session_id for session_id in gone
+                    if self._local_sessions.get(session_id) == local[session_id]]
+            for session_id in gone:
+                del self._local_sessions[session_id]
+        evicted += [(session_id, "elsewhere") for session_id in gone]
+        self._notify(evicted)
+        return len(evicted)
+
+    # Reads
+
+    def _existing(self, session_ids, chunk=500):
+        """The ones of session_ids still in the table (all of them if it can't be read)."""
+        session_ids = list(session_ids)
+        existing = set()
+        try:
+            for start in range(0, len(session_ids), chunk):
+                ids = session_ids[start:start + chunk]
+                existing.update(row[0] for row in self._connection().execute(
+                    f"SELECT session_id FROM sessions WHERE session_id IN ({', '.join('?' * len(ids))})", ids))
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Session store read failed: {e}")
+            return set(session_ids)
+        return existing
+
+    def get(self, session_id):
+        """The session's messages, oldest first, or None if there is no such session."""
+        try:
+            rows = self._connection().execute(
+                "SELECT m.role, m.content FROM sessions s LEFT JOIN messages m ON m.session_id = s.session_id "
+                "WHERE s.session_id = ? ORDER BY m.id", (session_id,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Session store read failed: {e}")
+            return None
+        if not rows:
+            return None
+        self._seen(session_id)
+        return [Message(role, content) for role, content in rows if role is not None]
+
+    def __contains__(self, session_id):
+        try:
+            return self._connection().execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is not None
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Session store read failed: {e}")
+            return False
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def stats(self):
+        try:
+            sessions = len(self)
+        except sqlite3.Error:
+            sessions = None
+        with self._lock:
+            local_sessions = len(self._local_sessions)
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": sessions,
+            "local_sessions": local_sessions,
+            "max_sessions": self.max_sessions,
+            "idle_ttl": self.idle_ttl,
+            "writes": self.writes,
+            "batches": self.batches,
+            "avg_batch_size": self.writes / self.batches if self.batches else 0.0,
+            "errors": self.errors,
+            "evictions": dict(self.evictions),
+            "reaper_runs": self.reaper_runs
+        }
+
+
+class RedisSessionStore(SessionStore):
+    """Session histories in Redis lists, shared by every node.
+
+    Each session is a list of JSON messages under "<prefix><session id>".
+    An append is one MULTI/EXEC round trip: RPUSH the new messages, read
+    the ones about to be trimmed, LTRIM to the last max_messages and reset
+    the key's expiry, so the cap and the idle TTL are both enforced by the
+    server. A session without messages reads as an empty list.
+
+    Calls go through redis-py's connection pool with short socket timeouts.
+    When Redis fails or times out, the error is logged and the request
+    carries on without history; further calls are skipped for
+    retry_after seconds so a down store costs one timeout, not one per
+    request.
+    """
+
+    def __init__(self, client, idle_ttl=86400, max_messages=MAX_MESSAGES, prefix='edubot:session:', retry_after=5.0):
+        super().__init__()
+        self.client = client
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self._errors = (OSError, redis.RedisError) if redis else (OSError,)
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self._local_sessions = {}  # session id -> last use in this process, for eviction listeners
+        self.calls = 0
+        self.errors = 0
+        self.skipped = 0
+        self.evictions = {"idle": 0}
+        self.reaper_runs = 0
+
+    @classmethod
+    def from_env(cls):
+        url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+        timeout = float(os.getenv('REDIS_TIMEOUT', '0.25'))
+        if url.startswith('memory://'):
+            from fake_redis import FakeRedis
+            client = FakeRedis(socket_timeout=timeout)
+        elif redis is None:
+            raise RuntimeError("SESSION_STORE=redis needs the redis package (pip install redis)")
+        else:
+            client = redis.Redis.from_url(
+                url,
+                socket_timeout=timeout,
+                socket_connect_timeout=timeout,
+                max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', '50')),
+                health_check_interval=30,
+            )
+        return cls(client, idle_ttl=int(os.getenv('SESSION_IDLE_TTL', '86400')))
+
+    def _key(self, session_id):
+        return f"{self.prefix}{session_id}"
+
+    def _run(self, description, call, default):
+        """Run call() against Redis, returning default if it fails or the store is marked down."""
+        if time.monotonic() < self._down_until:
+            self.skipped += 1
+            return default
+        self.calls += 1
+        try:
+            return call()
+        except self._errors as e:
+            self.errors += 1
+            self._down_until = time.monotonic() + self.retry_after
+            logger.warning(f"Redis session store {description} failed, continuing without it: {e}")
+            return default
+
+    def _seen(self, session_id):
+        with self._lock:
+            self._local_sessions[session_id] = time.monotonic()
+
+    def create(self, session_id):
+        self._seen(session_id)
+        self._run("create", lambda: self.client.delete(self._key(session_id)), None)
+
+    def get(self, session_id):
+        """The session's messages, oldest first ([] for an unknown session or when Redis is unavailable)."""
+        self._seen(session_id)
+        items = self._run("read", lambda: self.client.lrange(self._key(session_id), 0, -1), [])
+        return [Message.from_dict(json.loads(item)) for item in items]
+
+    def append(self, session_id, *messages):
+        """Append messages, keeping the last max_messages; returns the trimmed ones, oldest first."""
+        self._seen(session_id)
+        key = self._key(session_id)
+
+        def pipelined():
+            with self.client.pipeline(transaction=True) as pipe:
+                pipe.rpush(key, *[json.dumps(message.to_dict()) for message in messages])
+                pipe.lrange(key, 0, -(self.max_messages + 1))
+                pipe.ltrim(key, -self.max_messages, -1)
+                pipe.expire(key, self.idle_ttl)
+                return pipe.execute()[1]
+
+        return [Message.from_dict(json.loads(item)) for item in self._run("append", pipelined, [])]
+
+    def clear(self, session_id):
+        self._run("clear", lambda: self.client.delete(self._key(session_id)), None)
+
+    def __contains__(self, session_id):
+        return bool(self._run("read", lambda: self.client.exists(self._key(session_id)), 0))
+
+    def reap(self):
+        """Redis expires idle sessions itself; this only notifies listeners about locally idle ones."""
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            self.reaper_runs += 1
+            idle = [session_id for session_id, last_use in self._local_sessions.items() if last_use <= cutoff]
+            for session_id in idle:
+                del self._local_sessions[session_id]
+            self.evictions["idle"] += len(idle)
+        self._notify([(session_id, "idle") for session_id in idle])
+        return len(idle)
+
+    def stats(self):
+        with self._lock:
+            local_sessions = len(self._local_sessions)
+        return {
+            "backend": "redis",
+            "local_sessions": local_sessions,
+            "idle_ttl": self.idle_ttl,
+            "calls": self.calls,
+            "errors": self.errors,
+            "skipped_while_down": self.skipped,
+            "evictions": dict(self.evictions),
+            "reaper_runs": self.reaper_runs
+        }
+
+
+def session_store_from_env():
+    backend = os.getenv('SESSION_STORE', 'memory').lower()
+    if backend == 'sqlite':
+        try:
+            return SQLiteSessionStore.from_env()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open the SQLite session store, keeping sessions in memory: {e}")
+    elif backend == 'redis':
+        try:
+            return RedisSessionStore.from_env()
+        except (RuntimeError, ValueError) as e:
+            logger.warning(f"Could not set up the Redis session store, keeping sessions in memory: {e}")
+    elif backend != 'memory':
+        logger.warning(f"Unknown SESSION_STORE '{backend}', keeping sessions in memory")
+    return InMemorySessionStore.from_env()
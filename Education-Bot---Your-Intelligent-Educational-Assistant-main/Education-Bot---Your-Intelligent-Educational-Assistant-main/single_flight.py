@@ -0,0 +1,189 @@
+"""Coalescing of identical in-flight upstream calls ("single flight").
+
+The first caller for a key (the leader) makes the upstream call; callers
+arriving with the same key while it is running (followers) wait for it and
+receive the same result or exception. Streaming calls are shared too: a
+background thread (or task) drains the upstream stream into a shared
+buffer, and every caller, the first one included, replays it from there at
+its own pace. A slow or disconnected client therefore never holds up or
+breaks the stream for the others.
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = False
+        self.result = None
+        self.error = None
+        self.chunks = []
+
+
+class SingleFlight:
+    """Per-key coalescing for sync (threaded) and async callers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self._async_calls = {}
+        self._async_streams = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _join(self, calls, key, factory):
+        """Return (call, is_leader) for key, registering a new call if none is running."""
+        with self._lock:
+            call = calls.get(key)
+            if call is not None:
+                self.followers += 1
+                return call, False
+            call = factory()
+            calls[key] = call
+            self.leaders += 1
+            return call, True
+
+    def _leave(self, calls, key):
+        with self._lock:
+            calls.pop(key, None)
+
+    def do(self, key, fn):
+        """Return fn(), sharing one execution among concurrent callers with the same key."""
+        def new_call():
+            call = _Call()
+            call.event = threading.Event()
+            return call
+
+        call, leader = self._join(self._calls, key, new_call)
+        if not leader:
+            call.event.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._leave(self._calls, key)
+            call.event.set()
+
+    def stream(self, key, fn):
+        """Iterate over fn() (an iterable), sharing its chunks among concurrent callers."""
+        def new_call():
+            call = _Call()
+            call.condition = threading.Condition()
+            return call
+
+        call, leader = self._join(self._streams, key, new_call)
+        if leader:
+            threading.Thread(target=self._drain, args=(key, call, fn), name='single-flight-stream', daemon=True).start()
+        yield from self._follow(call)
+
+    def _drain(self, key, call, fn):
+        """Read fn() to the end into call.chunks, independently of the callers reading it."""
+        try:
+            for chunk in fn():
+                with call.condition:
+                    call.chunks.append(chunk)
+                    call.condition.notify_all()
+        except Exception as e:
+            call.error = e
+        finally:
+            self._leave(self._streams, key)
+            with call.condition:
+                call.done = True
+                call.condition.notify_all()
+
+    @staticmethod
+    def _follow(call):
+        index = 0
+        while True:
+            with call.condition:
+                while index >= len(call.chunks) and not call.done:
+                    call.condition.wait()
+                pending = call.chunks[index:]
+                finished = call.done
+            yield from pending
+            index += len(pending)
+            if finished and index >= len(call.chunks):
+                break
+        if call.error:
+            raise call.error
+
+    async def do_async(self, key, fn):
+        """Await fn(), sharing one execution among concurrent coroutines with the same key."""
+        call, leader = self._join(self._async_calls, key, lambda: asyncio.get_running_loop().create_future())
+        if not leader:
+            return await asyncio.shield(call)
+
+        try:
+            result = await fn()
+            call.set_result(result)
+            return result
+        except BaseException as e:
+            call.set_exception(e if isinstance(e, Exception) else RuntimeError("upstream call was cancelled"))
+            # Nobody may be waiting; don't let asyncio log an unretrieved exception
+            call.exception()
+            raise
+        finally:
+            self._leave(self._async_calls, key)
+
+    async def stream_async(self, key, fn):
+        """Async version of stream(); fn() returns an awaitable async iterator."""
+        def new_call():
+            call = _Call()
+            call.condition = asyncio.Condition()
+            return call
+
+        call, leader = self._join(self._async_streams, key, new_call)
+        if leader:
+            # Keep a reference: the event loop only holds tasks weakly
+            call.task = asyncio.get_running_loop().create_task(self._drain_async(key, call, fn))
+
+        index = 0
+        while True:
+            async with call.condition:
+                await call.condition.wait_for(lambda: index < len(call.chunks) or call.done)
+                pending = call.chunks[index:]
+                finished = call.done
+            for chunk in pending:
+                yield chunk
+            index += len(pending)
+            if finished and index >= len(call.chunks):
+                break
+        if call.error:
+            raise call.error
+
+    async def _drain_async(self, key, call, fn):
+        """Async version of _drain(), run as a task of its own."""
+        try:
+            async for chunk in await fn():
+                async with call.condition:
+                    call.chunks.append(chunk)
+                    call.condition.notify_all()
+        except BaseException as e:
+            # Includes cancellation when the event loop shuts down
+            call.error = e if isinstance(e, Exception) else RuntimeError("upstream stream was interrupted")
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self._leave(self._async_streams, key)
+            async with call.condition:
+                call.done = True
+                call.condition.notify_all()
+
+    def stats(self):
+        calls = self.leaders + self.followers
+        with self._lock:
+            in_flight = len(self._calls) + len(self._streams) + len(self._async_calls) + len(self._async_streams)
+        return {
+            "upstream_calls": self.leaders,
+            "coalesced_calls": self.followers,
+            "coalescing_ratio": self.followers / calls if calls else 0.0,
+            "in_flight": in_flight
+        }
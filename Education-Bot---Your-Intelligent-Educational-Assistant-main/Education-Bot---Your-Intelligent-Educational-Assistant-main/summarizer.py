@@ -0,0 +1,133 @@
+"""Background summaries of the turns that fall out of a session's history.
+
+When a session's history is trimmed, the evicted messages are handed to
+RollingSummarizer.submit, which returns immediately. A worker thread folds
+them into the session's running summary with the summarize function (a
+Gemini call in app.py); the summary is then sent with later prompts in
+place of the turns that are gone. Jobs for the same session are coalesced
+and run one at a time, so summaries are always built in order.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from history_window import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a tutoring conversation between a student and EduBot, an educational assistant.
+Update the summary with the new messages below. Keep the topics the student asked about, the key points that were explained, and anything the student found difficult or said about themselves. Drop greetings and small talk.
+Write at most {max_words} words. Reply with the updated summary only.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}"""
+
+
+def format_messages(messages):
+    return "\n".join(f"{'Student' if message.role == 'user' else 'EduBot'}: {message.content}"
+                     for message in messages)
+
+
+def summary_prompt(previous, messages, max_tokens):
+    return SUMMARY_PROMPT.format(max_words=max_tokens * 3 // 4, summary=previous or "(none yet)",
+                                 messages=format_messages(messages))
+
+
+def extractive_summary(previous, messages, max_tokens):
+    """Local fallback: the student's questions, newest kept first, within max_tokens."""
+    lines = previous.splitlines() if previous else []
+    lines += [f"- {' '.join(message.content.split())[:200]}" for message in messages if message.role == "user"]
+    header = "Earlier the student asked:"
+    kept, used = [], estimate_tokens(header)
+    for line in reversed([line for line in lines if line.startswith("- ")]):
+        used += estimate_tokens(line)
+        if used > max_tokens:
+            break
+        kept.append(line)
+    return "\n".join([header] + kept[::-1]) if kept else previous
+
+
+class _SessionSummary:
+    def __init__(self):
+        self.summary = None
+        self.pending = []
+        self.scheduled = False
+
+
+class RollingSummarizer:
+    """Per-session running summaries, updated on a background thread pool."""
+
+    def __init__(self, summarize, max_tokens=300, max_workers=1):
+        """summarize(previous_summary, messages) -> new summary; may raise."""
+        self._summarize = summarize
+        self.max_tokens = max_tokens
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='summarizer')
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self.runs = 0
+        self.failures = 0
+        self.folded_messages = 0
+        self.total_ms = 0.0
+
+    def submit(self, session_id, messages):
+        """Queue evicted messages to be folded into the session's summary."""
+        if not messages:
+            return
+        with self._lock:
+            state = self._sessions.setdefault(session_id, _SessionSummary())
+            state.pending.extend(messages)
+            if state.scheduled:
+                return
+            state.scheduled = True
+        self._executor.submit(self._run, state)
+
+    def _run(self, state):
+        while True:
+            with self._lock:
+                messages, state.pending = state.pending, []
+                if not messages:
+                    state.scheduled = False
+                    return
+                previous = state.summary
+
+            started = time.perf_counter()
+            try:
+                summary = self._summarize(previous, messages)
+            except Exception as e:
+                logger.warning(f"Summarization failed, keeping a local summary instead: {e}")
+                self.failures += 1
+                summary = extractive_summary(previous, messages, self.max_tokens)
+
+            with self._lock:
+                state.summary = summary or previous
+                self.runs += 1
+                self.folded_messages += len(messages)
+                self.total_ms += (time.perf_counter() - started) * 1000
+
+    def get(self, session_id):
+        """The session's current summary, or None."""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            return state.summary if state else None
+
+    def forget(self, session_id):
+        """Drop a session's summary; a job already running for it finishes unseen."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            sessions = len(self._sessions)
+            pending = sum(len(state.pending) for state in self._sessions.values())
+        return {
+            "sessions": sessions,
+            "pending_messages": pending,
+            "runs": self.runs,
+            "failures": self.failures,
+            "folded_messages": self.folded_messages,
+            "avg_ms": self.total_ms / self.runs if self.runs else 0.0
+        }
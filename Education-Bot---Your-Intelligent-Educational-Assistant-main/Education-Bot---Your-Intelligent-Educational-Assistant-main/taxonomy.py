@@ -0,0 +1,155 @@
+"""Curriculum taxonomy and a keyword index over it.
+
+The taxonomy file has one node per line:
+
+    math/calculus/integration: integral, integrals, antiderivative
+
+The last path segment (underscores read as spaces) is always a term of its
+node; the terms after the colon are extra synonyms. Blank lines and lines
+starting with '#' are ignored.
+
+Terms are matched with an Aho-Corasick automaton, so a query is scanned once
+no matter how many terms the taxonomy has.
+"""
+import logging
+import os
+from collections import deque, namedtuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TAXONOMY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'curriculum_taxonomy.txt')
+
+TaxonomyMatch = namedtuple('TaxonomyMatch', ['term', 'path', 'start', 'end'])
+
+
+class KeywordIndex:
+    """Aho-Corasick automaton mapping lower-cased keywords to payloads."""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # state -> [(keyword length, keyword, payload)]
+        self._keyword_count = 0
+        self._built = True
+
+    def __len__(self):
+        return self._keyword_count
+
+    def add(self, keyword, payload):
+        keyword = keyword.lower()
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(keyword), keyword, payload))
+        self._keyword_count += 1
+        self._built = False
+
+    def build(self):
+        """Compute failure links; call once after all keywords are added."""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                # A state also reports every keyword that is a suffix of its own
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+        self._built = True
+
+    def iter_matches(self, text, whole_words=True):
+        """Yield (start, end, keyword, payload) for every keyword occurrence in text.
+
+        With whole_words, occurrences adjacent to a letter or digit are skipped.
+        """
+        if not self._built:
+            self.build()
+        text = text.lower()
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, keyword, payload in output[state]:
+                start, end = i + 1 - length, i + 1
+                if whole_words and (
+                    (start > 0 and text[start - 1].isalnum()) or
+                    (end < len(text) and text[end].isalnum())
+                ):
+                    continue
+                yield start, end, keyword, payload
+
+
+class TaxonomyIndex:
+    """Finds curriculum nodes mentioned in a query."""
+
+    def __init__(self, nodes):
+        """nodes: iterable of (path, terms)."""
+        self._index = KeywordIndex()
+        self.paths = set()
+        for path, terms in nodes:
+            self.paths.add(path)
+            leaf_term = path.rsplit('/', 1)[-1].replace('_', ' ')
+            for term in {leaf_term, *terms}:
+                self._index.add(term, path)
+        self._index.build()
+
+    def __len__(self):
+        return len(self._index)
+
+    @classmethod
+    def from_file(cls, path):
+        nodes = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                node_path, _, terms = line.partition(':')
+                nodes.append((node_path.strip(), [term.strip() for term in terms.split(',') if term.strip()]))
+        return cls(nodes)
+
+    @classmethod
+    def from_terms(cls, terms):
+        """Flat taxonomy in which every term is its own top-level node."""
+        return cls((term.replace(' ', '_'), [term]) for term in terms)
+
+    def matches(self, query):
+        """All whole-word taxonomy terms in query, in order of their end position."""
+        return [TaxonomyMatch(keyword, path, start, end)
+                for start, end, keyword, path in self._index.iter_matches(query)]
+
+    def best_match(self, query):
+        """The most specific match: longest term, then deepest path. None if nothing matches."""
+        best = None
+        for match in self.matches(query):
+            if best is None or (len(match.term), match.path.count('/')) > (len(best.term), best.path.count('/')):
+                best = match
+        return best
+
+
+def load_taxonomy(fallback_terms=()):
+    """Load CURRICULUM_TAXONOMY_FILE (or the bundled taxonomy), else index fallback_terms."""
+    path = os.getenv('CURRICULUM_TAXONOMY_FILE', DEFAULT_TAXONOMY_FILE)
+    try:
+        index = TaxonomyIndex.from_file(path)
+        logger.info(f"Loaded {len(index.paths)} curriculum nodes ({len(index)} terms) from {path}")
+        return index
+    except OSError as e:
+        logger.warning(f"Could not load curriculum taxonomy from {path}: {e}")
+        return TaxonomyIndex.from_terms(fallback_terms)
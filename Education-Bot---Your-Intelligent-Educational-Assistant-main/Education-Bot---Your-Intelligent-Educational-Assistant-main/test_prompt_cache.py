@@ -0,0 +1,98 @@
+"""Offline checks of the system instruction caching backends.
+
+    python -m unittest test_prompt_cache
+"""
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import prompt_cache
+from prompt_cache import GeminiPromptCache, LocalPromptCache, PromptCache
+
+INSTRUCTION = "You are EduBot. " * 400
+
+
+class LocalPromptCacheTest(unittest.TestCase):
+    def test_requests_are_unchanged(self):
+        cache = LocalPromptCache()
+        for _ in range(3):
+            self.assertEqual(cache.config_fields("model-a", INSTRUCTION), {"system_instruction": INSTRUCTION})
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["creations"], stats["misses"], stats["hits"]), (1, 1, 1, 2))
+        self.assertGreater(stats["cached_tokens"], 0)
+
+    def test_one_entry_per_model_and_instruction(self):
+        cache = LocalPromptCache()
+        cache.config_fields("model-a", INSTRUCTION)
+        cache.config_fields("model-b", INSTRUCTION)
+        cache.config_fields("model-a", INSTRUCTION + "Be brief.")
+        self.assertEqual(cache.stats()["entries"], 3)
+
+    def test_entries_are_refreshed_after_ttl(self):
+        with mock.patch.object(prompt_cache, "REFRESH_MARGIN_SECONDS", 0):
+            cache = LocalPromptCache(ttl=0.05)
+            cache.config_fields("model-a", INSTRUCTION)
+            time.sleep(0.1)
+            cache.config_fields("model-a", INSTRUCTION)
+        self.assertEqual(cache.stats()["creations"], 2)
+
+    def test_failed_create_is_retried_later(self):
+        cache = LocalPromptCache()
+        with mock.patch.object(cache, "_create", side_effect=RuntimeError("quota")) as create:
+            cache.config_fields("model-a", INSTRUCTION)
+            cache.config_fields("model-a", INSTRUCTION)
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual((cache.stats()["failures"], cache.stats()["entries"]), (1, 0))
+
+    def test_slow_create_blocks_nobody(self):
+        cache = LocalPromptCache()
+        started, release = threading.Event(), threading.Event()
+        create = cache._create
+
+        def slow_create(model, system_instruction):
+            if model == "model-a":
+                started.set()
+                release.wait(5)
+            return create(model, system_instruction)
+
+        with mock.patch.object(cache, "_create", side_effect=slow_create):
+            creator = threading.Thread(target=cache.config_fields, args=("model-a", INSTRUCTION))
+            creator.start()
+            started.wait(5)
+            # Same key: served inline instead of creating a duplicate; other keys aren't held up
+            self.assertEqual(cache.config_fields("model-a", INSTRUCTION), {"system_instruction": INSTRUCTION})
+            cache.config_fields("model-b", INSTRUCTION)
+            self.assertEqual(cache.stats()["creations"], 1)
+            release.set()
+            creator.join()
+        self.assertEqual(cache.stats()["creations"], 2)
+
+
+class GeminiPromptCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.caches.create.return_value = SimpleNamespace(name="cachedContents/abc")
+
+    def test_cached_content_replaces_instruction(self):
+        cache = GeminiPromptCache(self.client)
+        self.assertEqual(cache.config_fields("model-a", INSTRUCTION), {"cached_content": "cachedContents/abc"})
+        self.assertEqual(cache.config_fields("model-a", INSTRUCTION), {"cached_content": "cachedContents/abc"})
+        self.assertEqual(self.client.caches.create.call_count, 1)
+
+    def test_short_instruction_skips_the_api(self):
+        cache = GeminiPromptCache(self.client)
+        self.assertEqual(cache.config_fields("model-a", "Be helpful."), {"system_instruction": "Be helpful."})
+        self.client.caches.create.assert_not_called()
+
+
+class NoPromptCacheTest(unittest.TestCase):
+    def test_instruction_is_sent_inline(self):
+        cache = PromptCache()
+        self.assertEqual(cache.config_fields("model-a", INSTRUCTION), {"system_instruction": INSTRUCTION})
+        self.assertEqual(cache.stats()["misses"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
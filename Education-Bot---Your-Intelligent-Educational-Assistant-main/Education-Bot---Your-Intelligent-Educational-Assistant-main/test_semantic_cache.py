@@ -0,0 +1,105 @@
+"""Regression checks for answers shared between paraphrased questions.
+
+Uses NLTK's real word tokenizer; the stop words, lemmatizer and tagger are
+stubbed so no NLTK data has to be installed.
+
+    python -m unittest test_semantic_cache
+"""
+import unittest
+from unittest import mock
+
+import text_analysis
+from semantic_cache import SemanticCache
+
+STOP_WORDS = frozenset({
+    "what", "is", "the", "of", "how", "do", "i", "to", "a", "an", "me", "it",
+    "not", "no", "nor", "can", "you",
+})
+
+
+class IdentityLemmatizer:
+    def lemmatize(self, token):
+        return token
+
+
+class NounTagger:
+    def tag(self, tokens):
+        return [(token, "NN") for token in tokens]
+
+
+class ParaphraseTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(text_analysis, "get_stop_words", return_value=STOP_WORDS),
+            mock.patch.object(text_analysis, "get_lemmatizer", return_value=IdentityLemmatizer()),
+            mock.patch.object(text_analysis, "get_tagger", return_value=NounTagger()),
+            # Punkt data isn't needed for one-sentence questions
+            mock.patch.object(text_analysis, "sent_tokenize", side_effect=lambda text: [text]),
+            mock.patch.object(text_analysis, "lemmatize", side_effect=lambda token: token),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def cached_answer(self, cached_question, question):
+        """What /chat would serve for question after answering cached_question."""
+        cache = SemanticCache()
+        if text_analysis.literal_tokens(cached_question) == []:
+            lemmas = text_analysis.analyze_user_input(cached_question)["tokens"]
+            cache.put(lemmas, "definition", f"answer to {cached_question}")
+        if text_analysis.literal_tokens(question) != []:
+            return None
+        return cache.get(text_analysis.analyze_user_input(question)["tokens"], "definition")
+
+    def test_paraphrase_is_served(self):
+        self.assertEqual(self.cached_answer("What is photosynthesis?", "Explain photosynthesis to me"),
+                         "answer to What is photosynthesis?")
+
+    def test_expressions_are_not_shared(self):
+        self.assertIsNone(self.cached_answer("What is the derivative of x^3?", "What is the derivative of x^2?"))
+
+    def test_word_order_matters(self):
+        self.assertIsNone(self.cached_answer("How do I convert Celsius to Fahrenheit?",
+                                             "How do I convert Fahrenheit to Celsius?"))
+
+    def test_negations_are_not_shared(self):
+        self.assertIsNone(self.cached_answer("Is a tomato a fruit?", "Is a tomato not a fruit?"))
+
+    def test_clitics_are_droppable(self):
+        for question in ("What's photosynthesis?", "Explain Newton's laws of motion",
+                         "Analyze the themes in Shakespeare's Hamlet", "I'm confused about mitosis"):
+            self.assertEqual(text_analysis.literal_tokens(question), [], question)
+        self.assertEqual(text_analysis.literal_tokens("Why don’t plants fall over?"), ["n't"])
+        self.assertEqual(self.cached_answer("What's photosynthesis?", "Explain photosynthesis to me"),
+                         "answer to What's photosynthesis?")
+
+    def test_literal_tokens(self):
+        self.assertEqual(text_analysis.literal_tokens("Isn't 2+2 = f(x)?"), ["n't", "2+2", "="])
+
+    def test_analysis_schema_is_unchanged(self):
+        self.assertEqual(set(text_analysis.analyze_user_input("What is photosynthesis?")), {
+            "tokens", "key_concepts", "question_type", "complexity", "sentence_count", "word_count"})
+
+
+
+class SemanticCacheTest(unittest.TestCase):
+    def test_near_duplicates_within_threshold(self):
+        cache = SemanticCache(threshold=0.7)
+        cache.put(["cell", "membrane", "transport", "protein"], "definition", "key")
+        # Lemma subset: 5 of 7 lemmas and pairs shared
+        self.assertEqual(cache.get(["explain", "cell", "membrane", "transport"], "definition"), "key")
+        self.assertIsNone(cache.get(["cell", "membrane"], "definition"))
+
+    def test_word_order_lowers_similarity(self):
+        cache = SemanticCache(threshold=0.5)
+        cache.put(["convert", "fahrenheit", "celsius"], "procedural", "key")
+        self.assertIsNone(cache.get(["convert", "celsius", "fahrenheit"], "procedural"))
+
+    def test_partitions_are_separate(self):
+        cache = SemanticCache()
+        cache.put(["photosynthesis"], "definition", "key")
+        self.assertIsNone(cache.get(["photosynthesis"], "procedural"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+"""Checks of RedisSessionStore against the in-process FakeRedis, and of
+SQLiteSessionStore against a temporary database file.
+
+    python -m unittest test_session_store
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+
+from fake_redis import FakeRedis
+from message import turn
+from session_store import RedisSessionStore, SQLiteSessionStore
+
+
+def contents(messages):
+    return [message.content for message in messages]
+
+
+class RedisSessionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeRedis()
+        self.store = RedisSessionStore(self.client, idle_ttl=60, max_messages=4, retry_after=0.1)
+
+    def test_append_is_one_round_trip(self):
+        self.store.append("s", *turn("q1", "a1"))
+        round_trips = self.client.round_trips
+        self.store.append("s", *turn("q2", "a2"))
+        self.assertEqual(self.client.round_trips, round_trips + 1)
+        history = self.store.get("s")
+        self.assertEqual(contents(history), ["q1", "a1", "q2", "a2"])
+        self.assertEqual([message.role for message in history], ["user", "assistant"] * 2)
+
+    def test_append_trims_and_returns_trimmed(self):
+        self.store.append("s", *turn("q1", "a1"))
+        self.store.append("s", *turn("q2", "a2"))
+        trimmed = self.store.append("s", *turn("q3", "a3"))
+        self.assertEqual(contents(trimmed), ["q1", "a1"])
+        self.assertEqual(contents(self.store.get("s")), ["q2", "a2", "q3", "a3"])
+
+    def test_idle_sessions_expire(self):
+        store = RedisSessionStore(self.client, idle_ttl=0.05, max_messages=4)
+        store.append("s", *turn("q1", "a1"))
+        self.assertIn("s", store)
+        time.sleep(0.1)
+        self.assertNotIn("s", store)
+        self.assertEqual(store.get("s"), [])
+
+    def test_append_resets_expiry(self):
+        store = RedisSessionStore(self.client, idle_ttl=0.2, max_messages=4)
+        store.append("s", *turn("q1", "a1"))
+        time.sleep(0.12)
+        store.append("s", *turn("q2", "a2"))
+        time.sleep(0.12)
+        self.assertEqual(contents(store.get("s")), ["q1", "a1", "q2", "a2"])
+
+    def test_timeout_degrades_and_skips(self):
+        self.store.append("s", *turn("q1", "a1"))
+        self.client.latency, self.client.socket_timeout = 0.05, 0.01
+
+        self.assertEqual(self.store.append("s", *turn("q2", "a2")), [])
+        self.assertEqual(self.store.errors, 1)
+        # Marked down: no further calls until retry_after has passed
+        round_trips = self.client.round_trips
+        self.assertEqual(self.store.get("s"), [])
+        self.assertEqual(self.client.round_trips, round_trips)
+        self.assertEqual(self.store.skipped, 1)
+
+        self.client.latency = 0.0
+        time.sleep(0.15)
+        self.assertEqual(contents(self.store.get("s")), ["q1", "a1"])
+
+
+class SQLiteSessionStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "sessions.db")
+        self.store = self.open_store()
+        self.evicted = []
+        self.store.add_eviction_listener(lambda session_id, reason: self.evicted.append((session_id, reason)))
+
+    def open_store(self, **kwargs):
+        store = SQLiteSessionStore(self.path, **dict({"max_messages": 4}, **kwargs))
+        self.addCleanup(store.close)
+        return store
+
+    def test_append_trims_and_returns_trimmed(self):
+        self.assertEqual(self.store.append("s", *turn("q1", "a1")), [])
+        self.store.append("s", *turn("q2", "a2"))
+        trimmed = self.store.append("s", *turn("q3", "a3"))
+        self.assertEqual(contents(trimmed), ["q1", "a1"])
+        history = self.store.get("s")
+        self.assertEqual(contents(history), ["q2", "a2", "q3", "a3"])
+        self.assertEqual([message.role for message in history], ["user", "assistant"] * 2)
+
+    def test_empty_and_missing_sessions(self):
+        self.store.create("s")
+        self.assertEqual(self.store.get("s"), [])
+        self.assertIsNone(self.store.get("missing"))
+        self.assertIn("s", self.store)
+        self.assertNotIn("missing", self.store)
+
+    def test_reap_evicts_idle_sessions(self):
+        store = self.open_store(idle_ttl=0.05)
+        evicted = []
+        store.add_eviction_listener(lambda session_id, reason: evicted.append((session_id, reason)))
+        store.append("s", *turn("q1", "a1"))
+        time.sleep(0.1)
+        self.assertEqual(store.reap(), 1)
+        self.assertEqual(evicted, [("s", "idle")])
+        self.assertIsNone(store.get("s"))
+        self.assertEqual(store.stats()["evictions"]["idle"], 1)
+
+    def test_reap_evicts_least_recently_used(self):
+        store = self.open_store(max_sessions=2)
+        evicted = []
+        store.add_eviction_listener(lambda session_id, reason: evicted.append((session_id, reason)))
+        for session_id in ("a", "b", "c"):
+            store.append(session_id, *turn("q1", "a1"))
+            time.sleep(0.01)
+        self.assertEqual(store.reap(), 1)
+        self.assertEqual(evicted, [("a", "lru")])
+        self.assertEqual(len(store), 2)
+
+    def test_instances_share_the_file(self):
+        other = self.open_store()
+        self.store.append("s", *turn("q1", "a1"))
+        other.append("s", *turn("q2", "a2"))
+        self.assertEqual(contents(self.store.get("s")), ["q1", "a1", "q2", "a2"])
+        other.clear("s")
+        self.assertEqual(self.store.get("s"), [])
+
+    def test_sessions_evicted_by_another_instance_are_reported(self):
+        other = self.open_store(max_sessions=1)
+        self.store.append("s", *turn("q1", "a1"))
+        time.sleep(0.01)
+        other.append("t", *turn("q1", "a1"))
+        other.reap()
+        self.assertEqual(self.evicted, [])
+        self.assertEqual(self.store.reap(), 1)
+        self.assertEqual(self.evicted, [("s", "elsewhere")])
+        self.assertEqual(self.store.stats()["local_sessions"], 0)
+
+    def test_locally_idle_sessions_are_reported(self):
+        store = self.open_store(idle_ttl=0.05)
+        evicted = []
+        store.add_eviction_listener(lambda session_id, reason: evicted.append((session_id, reason)))
+        store.append("s", *turn("q1", "a1"))
+        time.sleep(0.1)
+        # Another worker keeps the session alive in the table
+        self.store.append("s", *turn("q2", "a2"))
+        self.assertEqual(store.reap(), 1)
+        self.assertEqual(evicted, [("s", "idle")])
+        self.assertEqual(len(store.get("s")), 4)
+
+    def test_failed_batch_is_retried_one_by_one(self):
+        started, release = threading.Event(), threading.Event()
+
+        def blocker(conn):
+            started.set()
+            release.wait(5)
+
+        def failing(conn):
+            raise sqlite3.IntegrityError("constraint failed")
+
+        def submit(operation, *args):
+            future = Future()
+            self.store._queue.put((operation, args, future))
+            return future
+
+        blocked = submit(blocker)
+        started.wait(5)
+        # Both queue up behind the blocker and are committed as one batch
+        failed = submit(failing)
+        appended = submit(self.store._append_op, "s", turn("q1", "a1"))
+        release.set()
+        blocked.result(5)
+        with self.assertRaises(sqlite3.IntegrityError):
+            failed.result(5)
+        self.assertEqual(appended.result(5), [])
+        self.assertEqual(contents(self.store.get("s")), ["q1", "a1"])
+        self.assertEqual(self.store.stats()["batches"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
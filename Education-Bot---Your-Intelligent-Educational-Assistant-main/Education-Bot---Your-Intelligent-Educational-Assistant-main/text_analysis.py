@@ -0,0 +1,288 @@
+"""NLTK analysis of student questions, used to tailor the Gemini prompt.
+
+Also usable offline on logged questions:
+
+    python text_analysis.py batch questions.jsonl -o analysis.jsonl --workers 4
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from nltk.tokenize import sent_tokenize, word_tokenize
+
+from nltk_resources import get_lemmatizer, get_stop_words, get_tagger, warm_up
+
+logger = logging.getLogger(__name__)
+
+# Max number of distinct tokens whose lemma is kept in memory
+LEMMA_CACHE_SIZE = int(os.getenv('LEMMA_CACHE_SIZE', '50000'))
+
+# Checked in order; the first type with a matching keyword wins
+QUESTION_TYPE_KEYWORDS = (
+    ("definition", ("what", "define", "explain")),
+    ("procedural", ("how", "solve", "calculate")),
+    ("conceptual", ("why", "because", "reason")),
+    ("comparison", ("compare", "difference", "similar")),
+)
+
+# Dropped as stop words, but they reverse what a question asks
+NEGATION_WORDS = frozenset({"not", "no", "nor", "never", "n't", "none", "neither", "nothing", "cannot", "without"})
+# Characters of tokens that can be dropped without changing the question
+PUNCTUATION = frozenset(".,;:!?'\"`()[]{}-–—…“”")
+# Possessive and contraction endings split off by the tokenizer ("n't" is a negation)
+CLITICS = frozenset({"'s", "'m", "'re", "'ve", "'ll", "'d"})
+
+
+def _lemmatize(token):
+    return get_lemmatizer().lemmatize(token)
+
+
+# Student vocabulary is very skewed, so most WordNet lookups are repeats
+lemmatize = lru_cache(maxsize=LEMMA_CACHE_SIZE)(_lemmatize)
+
+
+def lemma_cache_stats():
+    """Hit/miss counters of the lemma cache, for monitoring."""
+    info = lemmatize.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "capacity": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0
+    }
+
+
+def warm_lemma_cache(path, limit=None):
+    """Pre-populate the lemma cache from a word-frequency list.
+
+    The file has one word per line, most frequent first; anything after the
+    first whitespace on a line (e.g. a count) is ignored. Returns the number
+    of words loaded.
+    """
+    if not get_lemmatizer():
+        return 0
+    limit = limit or lemmatize.cache_info().maxsize
+    loaded = 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if limit and loaded >= limit:
+                break
+            fields = line.split()
+            if fields:
+                lemmatize(fields[0].lower())
+                loaded += 1
+    logger.info(f"Warmed lemma cache with {loaded} words from {path}")
+    return loaded
+
+
+def _fallback_analysis():
+    return {"tokens": [], "key_concepts": [], "question_type": "general", "complexity": "medium"}
+
+
+def classify_question(text_lower):
+    """Return the question type for already lower-cased text."""
+    for question_type, keywords in QUESTION_TYPE_KEYWORDS:
+        if any(word in text_lower for word in keywords):
+            return question_type
+    return "general"
+
+
+def _tokenize(text, stop_words):
+    """Segment text into sentences once and tokenize each sentence once.
+
+    Returns (sentence_count, token_count, meaningful_tokens), where the
+    meaningful tokens are lower-cased, alphanumeric and not stop words.
+    """
+    sentences = sent_tokenize(text)
+    token_count = 0
+    meaningful_tokens = []
+    for sentence in sentences:
+        sentence_tokens = word_tokenize(sentence, preserve_line=True)
+        token_count += len(sentence_tokens)
+        for token in sentence_tokens:
+            token = token.lower()
+            if token.isalnum() and token not in stop_words:
+                meaningful_tokens.append(token)
+    return len(sentences), token_count, meaningful_tokens
+
+
+def _build_analysis(text, sentence_count, token_count, meaningful_tokens, pos_tags):
+    """Assemble the analysis dict from the shared tokenization and tagging results."""
+    lemmatized_tokens = [lemmatize(token) for token in meaningful_tokens]
+
+    # Nouns and adjectives are the key concepts
+    key_concepts = [word for word, pos in pos_tags if pos.startswith('NN') or pos.startswith('JJ')]
+
+    question_type = classify_question(text.lower())
+
+    # Estimate complexity based on vocabulary and sentence structure
+    avg_sentence_length = token_count / sentence_count
+
+    complexity = "medium"
+    if avg_sentence_length > 15 or len(key_concepts) > 5:
+        complexity = "high"
+    elif avg_sentence_length < 8 and len(key_concepts) < 3:
+        complexity = "low"
+
+    return {
+        "tokens": lemmatized_tokens,
+        "key_concepts": key_concepts,
+        "question_type": question_type,
+        "complexity": complexity,
+        "sentence_count": sentence_count,
+        "word_count": len(meaningful_tokens)
+    }
+
+
+def analyze_user_input(text):
+    """Analyze user input using NLTK for better understanding."""
+    try:
+        # NLTK data is loaded from disk on first use (see nltk_resources.py)
+        lemmatizer = get_lemmatizer()
+        stop_words = get_stop_words()
+        tagger = get_tagger()
+        if not lemmatizer or not stop_words or not tagger:
+            return _fallback_analysis()
+
+        sentence_count, token_count, meaningful_tokens = _tokenize(text, stop_words)
+        pos_tags = tagger.tag(meaningful_tokens)
+        return _build_analysis(text, sentence_count, token_count, meaningful_tokens, pos_tags)
+
+    except Exception as e:
+        logger.warning(f"NLTK analysis failed: {e}")
+        return _fallback_analysis()
+
+
+def content_lemmas(text):
+    """Lemmas of the meaningful tokens of text, without the POS tagging of a full analysis."""
+    try:
+        stop_words = get_stop_words()
+        if not get_lemmatizer() or not stop_words:
+            return []
+        return [lemmatize(token) for token in _tokenize(text, stop_words)[2]]
+    except Exception as e:
+        logger.warning(f"NLTK tokenization failed: {e}")
+        return []
+
+
+def literal_tokens(text):
+    """Tokens the analysis drops that still carry meaning, or None if text can't be tokenized.
+
+    These are symbols and expressions such as "x^2" or "2+2", and negations.
+    Two questions that differ only in them ("the derivative of x^2" and "of
+    x^3", "is a tomato a fruit" and "is a tomato not a fruit") have the same
+    lemmas, so they must not share answers by lemma similarity.
+    """
+    try:
+        # Typographic apostrophes would split "don’t" into "don", "’", "t"
+        tokens = word_tokenize(text.replace("’", "'"), preserve_line=True)
+    except Exception as e:
+        logger.warning(f"NLTK tokenization failed: {e}")
+        return None
+    literal = []
+    for token in tokens:
+        token = token.lower()
+        if token in NEGATION_WORDS or not (token.isalnum() or token in CLITICS or PUNCTUATION.issuperset(token)):
+            literal.append(token)
+    return literal
+
+
+def _analyze_chunk(texts):
+    """Analyze texts with one bulk tagging call; results match analyze_user_input."""
+    stop_words = get_stop_words()
+    tagger = get_tagger()
+    if not get_lemmatizer() or not stop_words or not tagger:
+        return [_fallback_analysis() for _ in texts]
+
+    tokenized = []
+    for text in texts:
+        try:
+            tokenized.append(_tokenize(text, stop_words))
+        except Exception as e:
+            logger.warning(f"NLTK analysis failed: {e}")
+            tokenized.append(None)
+
+    try:
+        tagged = iter(tagger.tag_sents([result[2] for result in tokenized if result is not None]))
+    except Exception as e:
+        logger.warning(f"Bulk tagging failed, analyzing one by one: {e}")
+        return [analyze_user_input(text) for text in texts]
+
+    results = []
+    for text, result in zip(texts, tokenized):
+        if result is None:
+            results.append(_fallback_analysis())
+            continue
+        try:
+            results.append(_build_analysis(text, *result, next(tagged)))
+        except Exception as e:
+            logger.warning(f"NLTK analysis failed: {e}")
+            results.append(_fallback_analysis())
+    return results
+
+
+def analyze_batch(texts, workers=1, chunk_size=256):
+    """Analyze many texts at once, optionally spread over a process pool.
+
+    Returns one analysis dict per text, in order, identical to calling
+    analyze_user_input on each text.
+    """
+    texts = list(texts)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    start = time.perf_counter()
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=warm_up) as pool:
+            chunk_results = list(pool.map(_analyze_chunk, chunks))
+    else:
+        chunk_results = [_analyze_chunk(chunk) for chunk in chunks]
+
+    results = [analysis for chunk in chunk_results for analysis in chunk]
+    elapsed = time.perf_counter() - start
+    if texts:
+        logger.info(f"Analyzed {len(texts)} texts in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.0f} items/sec)")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the EduBot NLTK analysis offline.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = subparsers.add_parser('batch', help="analyze a JSONL file of questions")
+    batch_parser.add_argument('input', help="JSONL file, one object per line")
+    batch_parser.add_argument('-o', '--output', help="write one analysis per line here (default: stdout)")
+    batch_parser.add_argument('--field', default='text', help="JSON field holding the question (default: text)")
+    batch_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    batch_parser.add_argument('--chunk-size', type=int, default=256, help="texts per worker task")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    with open(args.input, encoding='utf-8') as f:
+        texts = [json.loads(line)[args.field] for line in f if line.strip()]
+
+    start = time.perf_counter()
+    results = analyze_batch(texts, workers=args.workers, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for analysis in results:
+            out.write(json.dumps(analysis) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"{len(texts)} items in {elapsed:.2f}s: {len(texts) / max(elapsed, 1e-9):.1f} items/sec", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())